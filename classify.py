@@ -1,19 +1,42 @@
 # classify.py
-import json, time
+import asyncio, atexit, hashlib, json, time
 from pathlib import Path
-from jsonschema import validate, ValidationError
+import fastjsonschema, orjson
 
-from fs_ops import move_or_copy, append_log, file_sha256
-from prompts import SYSTEM_PROMPT, build_user_prompt
+from fs_ops import move_or_copy, append_log, file_hash, drop_file_cache
+from prompts import SYSTEM_PROMPT, SYSTEM_PROMPT_VERSION, build_user_prompt
 from taxonomy import REVIEW_FOLDER
-from ollama_client import chat_structured, OllamaError
-from openai_client import responses_parse_structured, OpenAIError
+from ollama_client import chat_structured_async, OllamaError
+from openai_client import responses_parse_structured_async, OpenAIError
 from ingest import ingest_file
 from schemas import build_docsort_model
-from index_store import upsert_document
+from index_store import (
+    DocumentBatcher,
+    get_index_store,
+    llm_cache_get,
+    llm_cache_put,
+)
 from embedder_local import embed_texts_ollama
 from paths import canon
 
+EMB_MODEL = "bge-m3:567m"
+LLM_CACHE_TTL_S: int | None = None  # None = cached classifications never expire
+# image sizing per provider (see image_utils.vision_max_dimension)
+VISION_TARGETS = {"openai": "openai-high"}
+
+# Index updates are queued and written in batches (one embed call + one FAISS
+# write per batch instead of per file).
+_INDEX_BATCHER = DocumentBatcher(
+    lambda texts: embed_texts_ollama(texts, model=EMB_MODEL), embed_model=EMB_MODEL
+)
+atexit.register(_INDEX_BATCHER.flush)
+
+
+def flush_index() -> None:
+    """Block until all queued index updates are written (call at end of a run)."""
+    _INDEX_BATCHER.flush()
+    get_index_store().flush()
+
 
 def _ns_to_ms(ns):
     try:
@@ -47,6 +70,28 @@ def _openai_metrics(meta: dict) -> dict:
     }
 
 
+_VALIDATORS: dict[int, tuple[dict, object]] = {}
+
+
+def _compiled_validator(schema: dict):
+    """fastjsonschema validator, compiled once per schema object."""
+    hit = _VALIDATORS.get(id(schema))
+    if hit is None or hit[0] is not schema:
+        if len(_VALIDATORS) >= 16:
+            _VALIDATORS.clear()
+        hit = (schema, fastjsonschema.compile(schema))
+        _VALIDATORS[id(schema)] = hit
+    return hit[1]
+
+
+def _llm_cache_key(doc_id: str, model: str, allowed_paths: list[str]) -> str:
+    paths_hash = hashlib.sha256(
+        json.dumps(allowed_paths, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    raw = f"{doc_id}|{model}|{paths_hash}|{SYSTEM_PROMPT_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
 def _build_representation(
     title: str, final_rel_path: str, tags: list[str], caption: str | None, excerpt: str
 ) -> str:
@@ -58,21 +103,75 @@ def _build_representation(
     return "\n".join(parts)
 
 
-def classify_item(
+async def ingest_item_async(
+    src_path: Path, *, provider: str = "ollama", doc_id: str | None = None
+) -> tuple:
+    """
+    Stage 1 (disk/CPU): hash and ingest off the event loop.
+    -> (doc_id, excerpt, image_paths, cleanup); pass doc_id if already known.
+    """
+    hash_task = None
+    if doc_id is None:
+        hash_task = asyncio.create_task(asyncio.to_thread(file_hash, src_path))
+    try:
+        excerpt, image_paths, cleanup = await asyncio.to_thread(
+            ingest_file, src_path, VISION_TARGETS.get(provider)
+        )
+    except BaseException:
+        if hash_task is not None:
+            hash_task.cancel()
+        raise
+    if hash_task is not None:
+        try:
+            doc_id = await hash_task
+        except BaseException:
+            cleanup()
+            raise
+    return doc_id, excerpt, image_paths, cleanup
+
+
+async def classify_item_async(
     src_path: Path,
     lib_root: Path,
     allowed_paths: list[str],
     schema: dict,
     *,
     provider: str = "ollama",  # "ollama" | "openai"
+    doc_id: str | None = None,  # content hash, if the caller already has it
+    **kwargs,
+) -> Path:
+    # 1) Hash and ingest (text + optional images) concurrently, off the event loop
+    ingested = await ingest_item_async(src_path, provider=provider, doc_id=doc_id)
+    return await classify_ingested_async(
+        src_path,
+        ingested,
+        lib_root,
+        allowed_paths,
+        schema,
+        provider=provider,
+        **kwargs,
+    )
+
+
+async def classify_ingested_async(
+    src_path: Path,
+    ingested: tuple,
+    lib_root: Path,
+    allowed_paths: list[str],
+    schema: dict,
+    *,
+    provider: str = "ollama",  # "ollama" | "openai"
     min_confidence: float = 0.6,
     action: str = "move",
     model: str = "gemma3:27b",
     keep_alive: str | int | None = "2h",
     dry_run: bool = False,
 ) -> Path:
-    # 1) Ingest (text + optional images)
-    excerpt, image_paths, cleanup = ingest_file(src_path)
+    """
+    Stage 2 (network): model call, move and indexing for the result of
+    ingest_item_async. Always runs the ingest cleanup.
+    """
+    doc_id, excerpt, image_paths, cleanup = ingested
     try:
         # 2) Build prompt (with optional excerpt)
         user_prompt = build_user_prompt(src_path.name, allowed_paths, excerpt or None)
@@ -80,11 +179,28 @@ def classify_item(
             Path("./logs/dryrun.jsonl") if dry_run else Path("./logs/processed.jsonl")
         )
 
+        # Content hash (doc_id) doubles as LLM cache key
+        cache_key = _llm_cache_key(doc_id, model, allowed_paths)
+        cached = llm_cache_get(cache_key, max_age_s=LLM_CACHE_TTL_S)
+
         # 2) Provider-specific call (both without history)
-        if provider == "openai":
+        if cached is not None:
+            target_rel = cached["target_path"]
+            confidence = float(cached["confidence"])
+            reason = cached.get("reason", "")
+            alternatives = cached.get("alternatives", [])
+            tags = cached.get("tags", [])
+            caption = cached.get("caption", None)
+            metrics = {
+                "provider": provider,
+                "latency_ms": 0.0,
+                "model": model,
+                "cache_hit": True,
+            }
+        elif provider == "openai":
             # Dynamically build Pydantic model from allowed paths
             DocSortModel = build_docsort_model(allowed_paths)
-            parsed, meta = responses_parse_structured(
+            parsed, meta = await responses_parse_structured_async(
                 model=model,
                 system_prompt=SYSTEM_PROMPT,
                 user_text=user_prompt,
@@ -100,7 +216,7 @@ def classify_item(
             metrics = _openai_metrics(meta)
         else:
             t0 = time.perf_counter()
-            raw_json, meta = chat_structured(
+            raw_json, meta = await chat_structured_async(
                 model=model,
                 system=SYSTEM_PROMPT,
                 user_content=user_prompt,
@@ -110,8 +226,8 @@ def classify_item(
                 keep_alive=keep_alive,
             )
             wall_ms = (time.perf_counter() - t0) * 1000.0
-            obj = json.loads(raw_json)
-            validate(instance=obj, schema=schema)
+            obj = orjson.loads(raw_json)
+            _compiled_validator(schema)(obj)
             target_rel = obj["target_path"]
             confidence = float(obj["confidence"])
             reason = obj.get("reason", "")
@@ -120,6 +236,19 @@ def classify_item(
             caption = obj.get("caption", None)
             metrics = _ollama_metrics(meta, wall_ms)
 
+        if cached is None:
+            llm_cache_put(
+                cache_key,
+                {
+                    "target_path": target_rel,
+                    "confidence": confidence,
+                    "reason": reason,
+                    "alternatives": alternatives,
+                    "tags": tags,
+                    "caption": caption,
+                },
+            )
+
         tgt_dir = lib_root / (
             REVIEW_FOLDER if confidence < min_confidence else target_rel
         )
@@ -137,8 +266,7 @@ def classify_item(
                 excerpt=excerpt or "",
             )
 
-            doc_id = file_sha256(src_path)
-            upsert_document(
+            _INDEX_BATCHER.submit(
                 doc_id=doc_id,
                 final_path=str(dst_abs),
                 title=dst_abs.name,
@@ -146,7 +274,6 @@ def classify_item(
                 caption=caption,
                 excerpt=excerpt or "",
                 represent_text=rep_text,
-                embed_fn=lambda texts: embed_texts_ollama(texts, model="bge-m3:567m"),
             )
 
             append_log(
@@ -167,7 +294,13 @@ def classify_item(
             )
             return dst_abs
 
-        dst = move_or_copy(src_path, tgt_dir, action)  # type: ignore[arg-type]
+        dst = await asyncio.to_thread(
+            move_or_copy, src_path, tgt_dir, action  # type: ignore[arg-type]
+        )
+        # hashed, ingested and placed: keep the page cache for hot files (SQLite, FAISS)
+        drop_file_cache(dst)
+        if action == "copy":
+            drop_file_cache(src_path)
 
         # direct indexing
         dst_abs = canon(dst)
@@ -180,8 +313,8 @@ def classify_item(
             excerpt=excerpt or "",
         )
 
-        doc_id = file_sha256(dst_abs)
-        upsert_document(
+        # same content as src_path -> doc_id computed above still applies
+        _INDEX_BATCHER.submit(
             doc_id=doc_id,
             final_path=str(dst_abs),
             title=dst_abs.name,
@@ -189,7 +322,6 @@ def classify_item(
             caption=caption,
             excerpt=excerpt or "",
             represent_text=rep_text,
-            embed_fn=lambda texts: embed_texts_ollama(texts, model="bge-m3:567m"),
         )
 
         append_log(
@@ -214,3 +346,16 @@ def classify_item(
             cleanup()
         except Exception:
             pass
+
+
+def classify_item(
+    src_path: Path,
+    lib_root: Path,
+    allowed_paths: list[str],
+    schema: dict,
+    **kwargs,
+) -> Path:
+    """Synchronous entry point; see classify_item_async for the keyword options."""
+    return asyncio.run(
+        classify_item_async(src_path, lib_root, allowed_paths, schema, **kwargs)
+    )
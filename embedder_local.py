@@ -1,7 +1,29 @@
 # embedder_local.py
-import numpy as np, ollama
+import threading
+import httpx, numpy as np, ollama
 
+# one client for all embed calls: its httpx pool keeps connections to the
+# Ollama server alive between calls
+_CLIENT: ollama.Client | None = None
+_CLIENT_LOCK = threading.Lock()
 
-def embed_texts_ollama(texts: list[str], model: str = "bge-m3:567m") -> np.ndarray:
-    r = ollama.embed(model=model, input=texts)  # {"embeddings":[...]}
+
+def _get_client() -> ollama.Client:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            # host from OLLAMA_HOST, like ollama.embed()
+            _CLIENT = ollama.Client(limits=httpx.Limits(max_keepalive_connections=4))
+        return _CLIENT
+
+
+def embed_texts_ollama(
+    texts: list[str],
+    model: str = "bge-m3:567m",
+    client: ollama.Client | None = None,
+) -> np.ndarray:
+    # one request for the whole list (array input)
+    r = (client or _get_client()).embed(
+        model=model, input=texts
+    )  # {"embeddings":[...]}
     return np.asarray(r["embeddings"], dtype="float32")
@@ -1,23 +1,232 @@
 # fs_ops.py
-import base64, hashlib, json, shutil, time
+import ctypes, functools, hashlib, json, mmap, os, shutil, sys, threading, time
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Literal
 
+from filelock import FileLock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 Action = Literal["move", "copy"]
 
 
-def b64_image(path: Path) -> str:
-    return base64.b64encode(path.read_bytes()).decode("ascii")
+def image_bytes(path: Path) -> bytes:
+    """Raw image bytes (memoized per path/size/mtime, so repeated sends read once)."""
+    st = os.stat(path)
+    return _image_bytes_cached(str(path), st.st_size, st.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _image_bytes_cached(path: str, size: int, mtime_ns: int) -> bytes:
+    return Path(path).read_bytes()
+
+
+try:  # optional: FAST_HASH=1 switches content hashing to BLAKE3
+    import blake3
+except ImportError:
+    blake3 = None
+
+FAST_HASH = os.getenv("FAST_HASH", "") not in ("", "0")
+BLAKE3_PREFIX = "blake3:"  # keeps BLAKE3 ids apart from (unprefixed) SHA256 ids
+# prefix of the ids file_hash produces in this process
+HASH_PREFIX = BLAKE3_PREFIX if FAST_HASH and blake3 is not None else ""
+
+HASH_MMAP_THRESHOLD = 16 << 20  # files above this are hashed via mmap
+HASH_MMAP_SLICE = 64 << 20  # bytes per hashlib.update (GIL released inside)
+HASH_CHUNK = 2 << 20  # read size below the mmap threshold
+HASH_SINGLE_SHOT_MAX = 8 << 20  # files up to this size: one read, one update
+
+
+def _sha256_factory():
+    """
+    SHA256 constructor, chosen once at import. hashlib.sha256 is OpenSSL's,
+    which uses the SHA-NI / ARMv8 SHA instructions where the CPU has them;
+    CPython's builtin fallback (no OpenSSL) is several times slower.
+    """
+    if hashlib.sha256.__name__.startswith("openssl_"):
+        return hashlib.sha256
+    print(
+        "[fs_ops][warn] hashlib.sha256 is not OpenSSL-backed; "
+        "hashing falls back to the slow builtin SHA256"
+    )
+    return lambda: hashlib.new("sha256")
+
+
+_SHA256 = _sha256_factory()
+
+
+def _fadvise(fd: int, *advice: int) -> None:
+    if not hasattr(os, "posix_fadvise"):  # Linux/BSD only
+        return
+    for a in advice:
+        try:
+            os.posix_fadvise(fd, 0, 0, a)
+        except OSError:
+            pass
+
+
+def prefetch_file(p: Path) -> None:
+    """Ask the kernel to start reading p in the background (WILLNEED)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(p, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, os.POSIX_FADV_SEQUENTIAL, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def drop_file_cache(p: Path) -> None:
+    """Evict p from the page cache once we are done with it (DONTNEED)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(p, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _open_noatime(p: Path) -> int:
+    """os.open for reading; O_NOATIME (Linux) skips the atime update if allowed."""
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    noatime = getattr(os, "O_NOATIME", 0)
+    if noatime:
+        try:
+            return os.open(p, flags | noatime)
+        except PermissionError:  # only allowed for the file owner
+            pass
+    return os.open(p, flags)
 
 
 def file_sha256(p: Path) -> str:
-    h = hashlib.sha256()
-    with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(1 << 20), b""):
-            h.update(chunk)
+    # buffering=0: read straight into our buffers, no extra BufferedReader copy
+    with open(_open_noatime(p), "rb", buffering=0) as f:
+        # larger readahead; pages stay cached because ingest reads the file next
+        if hasattr(os, "posix_fadvise"):
+            _fadvise(f.fileno(), os.POSIX_FADV_SEQUENTIAL)
+        size = os.fstat(f.fileno()).st_size
+        if size > HASH_MMAP_THRESHOLD:
+            return _sha256_mmap(f.fileno(), size)
+        h = _SHA256()
+        if size <= HASH_SINGLE_SHOT_MAX:
+            # typical images/PDFs: no Python loop, one contiguous span
+            h.update(f.readall())
+            return h.hexdigest()
+        # one preallocated buffer instead of a new bytes per chunk
+        buf = bytearray(HASH_CHUNK)
+        view = memoryview(buf)
+        while n := f.readinto(buf):
+            h.update(view[:n])
+        return h.hexdigest()
+
+
+def content_id(p: Path) -> str:
+    """
+    "blake3:<hex>" of a file: BLAKE3 over mmap, multithreaded within the file
+    (SHA256 cannot split one file across cores). Needs the blake3 package.
+    """
+    h = blake3.blake3(max_threads=blake3.blake3.AUTO)
+    h.update_mmap(str(p))
+    return BLAKE3_PREFIX + h.hexdigest()
+
+
+def file_hash(p: Path) -> str:
+    """
+    Content id of a file: SHA256 hex, or content_id (BLAKE3) with FAST_HASH=1.
+    """
+    if HASH_PREFIX:
+        return content_id(p)
+    return file_sha256(p)
+
+
+_HASH_POOL: ThreadPoolExecutor | None = None
+_HASH_POOL_LOCK = threading.Lock()
+
+
+def _hash_pool() -> ThreadPoolExecutor:
+    """Shared hashing threads, one per core (created on first use)."""
+    global _HASH_POOL
+    with _HASH_POOL_LOCK:
+        if _HASH_POOL is None:
+            _HASH_POOL = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="hash"
+            )
+        return _HASH_POOL
+
+
+def _file_hash_or_none(p: Path) -> str | None:
+    try:
+        return file_hash(p)
+    except OSError:
+        return None
+
+
+def file_hashes(paths: list[Path], workers: int | None = None) -> list[str | None]:
+    """
+    file_hash of many files at once, in input order, on a thread pool
+    (hashing releases the GIL, so independent files use separate cores).
+    workers=None uses the shared per-core pool; an explicit count gets a
+    pool of its own. None for files that cannot be read (e.g. vanished).
+    """
+    if len(paths) <= 1:
+        return [_file_hash_or_none(p) for p in paths]
+    if workers is None:
+        return list(_hash_pool().map(_file_hash_or_none, paths))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as pool:
+        return list(pool.map(_file_hash_or_none, paths))
+
+
+def _split_hash(h: str) -> tuple[str, bytes]:
+    """ "blake3:<hex>" -> ("blake3:", digest); "<hex>" -> ("", digest)"""
+    prefix, _, hexdigest = h.rpartition(":")
+    return (prefix + ":" if prefix else ""), bytes.fromhex(hexdigest)
+
+
+def _sha256_mmap(fd: int, size: int) -> str:
+    h = _SHA256()
+    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)  # aggressive readahead, early reclaim
+        view = memoryview(mm)
+        try:
+            for off in range(0, size, HASH_MMAP_SLICE):
+                h.update(view[off : off + HASH_MMAP_SLICE])
+        finally:
+            view.release()
     return h.hexdigest()
 
 
+SHM_DIR = "/dev/shm"  # Linux tmpfs (RAM-backed)
+SHM_MIN_FREE = 256 << 20  # fall back to the default temp dir below this
+
+
+def scratch_dir() -> str | None:
+    """
+    Parent dir for short-lived scratch files (resized images, extracted
+    pages): /dev/shm if writable and with enough free space, else None
+    (= tempfile default).
+    """
+    try:
+        if not os.access(SHM_DIR, os.W_OK):
+            return None
+        st = os.statvfs(SHM_DIR)
+    except (OSError, AttributeError):  # no /dev/shm / Windows
+        return None
+    return SHM_DIR if st.f_bavail * st.f_frsize >= SHM_MIN_FREE else None
+
+
 def unique_dest_path(dst_dir: Path, filename: str) -> Path:
     dst_dir.mkdir(parents=True, exist_ok=True)
     target = dst_dir / filename
@@ -32,44 +241,205 @@ def unique_dest_path(dst_dir: Path, filename: str) -> Path:
         i += 1
 
 
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
 def move_or_copy(src: Path, dst_dir: Path, mode: Action) -> Path:
     dst_dir.mkdir(parents=True, exist_ok=True)
     target = unique_dest_path(dst_dir, src.name)
     if mode == "move":
-        shutil.move(str(src), str(target))
+        if os.stat(src).st_dev == os.stat(dst_dir).st_dev:
+            os.rename(src, target)  # same filesystem: metadata only
+        else:
+            shutil.move(str(src), str(target))
     else:
-        shutil.copy2(str(src), str(target))
+        if _clone_file(src, target):
+            shutil.copystat(str(src), str(target))
+        else:
+            shutil.copy2(str(src), str(target))
     return target
 
 
+def _clone_file(src: Path, dst: Path) -> bool:
+    """
+    Copy-on-write copy (btrfs/xfs reflink, APFS clonefile; copy_file_range
+    lets the kernel copy server-/fs-side). False if nothing was written and
+    the caller should fall back to shutil.copy2.
+    """
+    if sys.platform == "darwin":
+        return _clonefile_darwin(src, dst)
+    if fcntl is None or not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with src.open("rb") as fsrc, dst.open("xb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return True
+            except OSError:
+                pass
+            size = os.fstat(fsrc.fileno()).st_size
+            done = 0
+            while done < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - done)
+                if n == 0:
+                    break
+                done += n
+        if done == size:
+            return True
+    except OSError:
+        pass
+    dst.unlink(missing_ok=True)
+    return False
+
+
+def _clonefile_darwin(src: Path, dst: Path) -> bool:
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return (
+            libc.clonefile(os.fsencode(src), os.fsencode(dst), ctypes.c_uint32(0)) == 0
+        )
+    except (OSError, AttributeError):
+        return False
+
+
+_SIDECAR_PREFIXES = ("", BLAKE3_PREFIX)
+
+
+def _hashes_sidecar(logfile: Path, prefix: str = "") -> Path:
+    # processed.jsonl -> processed.hashes: raw 32-byte SHA256 digests, back to back
+    # (BLAKE3 ids: processed.blake3.hashes, also 32 bytes each)
+    if prefix:
+        return logfile.with_suffix(f".{prefix.rstrip(':')}.hashes")
+    return logfile.with_suffix(".hashes")
+
+
+def _sidecar_stamp(logfile: Path) -> Path:
+    # processed.hashes.stamp: size + mtime of the log the sidecars match
+    return logfile.with_suffix(".hashes.stamp")
+
+
+def _log_sig(logfile: Path) -> str | None:
+    try:
+        st = logfile.stat()
+    except FileNotFoundError:
+        return None
+    return f"{st.st_size} {st.st_mtime_ns}"
+
+
+def _read_stamp(stamp: Path) -> str | None:
+    try:
+        return stamp.read_text(encoding="ascii")
+    except (OSError, ValueError):
+        return None
+
+
+def _sidecar_lock(logfile: Path) -> FileLock:
+    # CLI, web UI and watcher append to the same log: log line, sidecar and
+    # stamp are updated together under this lock
+    return FileLock(str(logfile.with_suffix(".hashes.lock")))
+
+
 def append_log(logfile: Path, record: dict) -> None:
     logfile.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps({"ts": int(time.time()), **record}, ensure_ascii=False) + "\n"
+    if not any(_hashes_sidecar(logfile, p).exists() for p in _SIDECAR_PREFIXES):
+        # no sidecars (e.g. dryrun.jsonl, or not built yet): nothing to keep in sync
+        with logfile.open("a", encoding="utf-8") as f:
+            f.write(line)
+        return
+    with _sidecar_lock(logfile):
+        _append_synced(logfile, record, line)
+
+
+def _append_synced(logfile: Path, record: dict, line: str) -> None:
+    stamp = _sidecar_stamp(logfile)
+    # sidecars are only extended while they match the log; otherwise they are
+    # rebuilt from the full log on the next load
+    in_sync = _read_stamp(stamp) == _log_sig(logfile)
     with logfile.open("a", encoding="utf-8") as f:
-        f.write(
-            json.dumps({"ts": int(time.time()), **record}, ensure_ascii=False) + "\n"
-        )
+        f.write(line)
+    if not in_sync:
+        return
+    h = record.get("hash")
+    if h and record.get("dry_run") is not True:
+        prefix, digest = _split_hash(h)
+        sidecar = _hashes_sidecar(logfile, prefix)
+        if sidecar.exists():
+            with sidecar.open("ab") as f:
+                f.write(digest)
+    stamp.write_text(_log_sig(logfile), encoding="ascii")
 
 
 def load_processed_hashes(logfile: Path) -> set[str]:
     """
-    Parse processed.jsonl without dry-run entries for idempotency (only real moves/copies).
+    Hashes of processed.jsonl without dry-run entries for idempotency (only real moves/copies).
+    Read from the processed.hashes sidecar; rebuilt from the log if missing or
+    if the log changed behind its back (size/mtime differ from the stamp).
+    No log, no hashes: deleting processed.jsonl resets idempotency.
     """
     if not logfile.exists():
+        for f in (
+            *(_hashes_sidecar(logfile, p) for p in _SIDECAR_PREFIXES),
+            _sidecar_stamp(logfile),
+        ):
+            f.unlink(missing_ok=True)
+        return set()
+    with _sidecar_lock(logfile):
+        return _load_synced(logfile)
+
+
+def _load_synced(logfile: Path) -> set[str]:
+    sidecars = {
+        prefix: _hashes_sidecar(logfile, prefix) for prefix in _SIDECAR_PREFIXES
+    }
+    stamp = _sidecar_stamp(logfile)
+    sig = _log_sig(logfile)
+    if sig is None:  # deleted meanwhile
         return set()
+    if _read_stamp(stamp) == sig and all(sc.exists() for sc in sidecars.values()):
+        hashes = set()
+        for prefix, sc in sidecars.items():
+            data = sc.read_bytes()
+            hashes.update(
+                prefix + data[i : i + 32].hex() for i in range(0, len(data) - 31, 32)
+            )
+        return hashes
     hashes = set()
-    with logfile.open("r", encoding="utf-8") as f:
+    with logfile.open("rb") as f:
         for line in f:
-            try:
-                obj = json.loads(line)
-                if obj.get("dry_run") is True:
-                    continue
-                h = obj.get("hash")
-                if h:
-                    hashes.add(h)
-            except Exception:
-                continue
+            h = _hash_from_log_line(line)
+            if h:
+                hashes.add(h)
+    digests: dict[str, list[bytes]] = {prefix: [] for prefix in sidecars}
+    for h in sorted(hashes):
+        prefix, digest = _split_hash(h)
+        if prefix in digests:
+            digests[prefix].append(digest)
+    for prefix, sc in sidecars.items():
+        tmp = sc.with_suffix(".tmp")
+        tmp.write_bytes(b"".join(digests[prefix]))
+        os.replace(tmp, sc)
+    # sig from before the read: lines appended meanwhile trigger a rebuild
+    stamp.write_text(sig, encoding="ascii")
     return hashes
 
 
+def _hash_from_log_line(line: bytes) -> str | None:
+    # fast path: lines written by append_log (json.dumps default separators)
+    if b'"dry_run": true' not in line:
+        _, sep, rest = line.partition(b'"hash": "')
+        if sep:
+            h = rest[:64]
+            if len(h) == 64 and rest[64:65] == b'"':
+                return h.decode("ascii")
+    try:
+        obj = orjson.loads(line)
+        if obj.get("dry_run") is True:
+            return None
+        return obj.get("hash") or None
+    except Exception:
+        return None
+
+
 def is_image_file(p: Path) -> bool:
     return p.is_file() and p.suffix.lower() in {".jpg", ".jpeg", ".png"}
@@ -1,6 +1,6 @@
 # hybrid_search.py
 from __future__ import annotations
-import argparse, json, sqlite3, faiss, numpy as np
+import argparse, functools, json, sqlite3, threading, faiss, numpy as np
 from pathlib import Path
 from typing import List, Tuple, Dict, Any
 
@@ -11,17 +11,46 @@ VEC_PATH = BASE / "vec.faiss"
 from embedder_local import embed_texts_ollama
 from search_normalize import expand_fts_query
 
+# Statements kept as constants; sqlite3 caches the prepared statements per connection.
+_SQL_SPARSE = (
+    "SELECT d.doc_id_i, bm25(docs_fts, 5.0,8.0,2.0,1.0,0.1) AS r "
+    "FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+    "WHERE docs_fts MATCH ? ORDER BY r LIMIT ?"
+)
+_SQL_SPARSE_FALLBACK = (
+    "SELECT d.doc_id_i, docs_fts.rank "
+    "FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+    "WHERE docs_fts MATCH ? ORDER BY docs_fts.rank LIMIT ?"
+)
+_CON_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_con() -> sqlite3.Connection:
+    """One read connection per process (the DB is in WAL mode, see index_store)."""
+    return sqlite3.connect(DB_PATH, check_same_thread=False)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_index(mtime_ns: int):
+    return faiss.read_index(str(VEC_PATH))
+
+
+def _get_index():
+    """FAISS index, re-read only when vec.faiss changed on disk."""
+    return _load_index(VEC_PATH.stat().st_mtime_ns)
+
 
 def _normalize(X: np.ndarray) -> np.ndarray:
-    X = X.astype("float32")
-    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    faiss.normalize_L2(X)  # in-place C routine
     return X
 
 
 def _dense_search(query: str, k: int, emb_model: str) -> List[Tuple[int, float]]:
     if not VEC_PATH.exists():
         raise FileNotFoundError(f"FAISS index missing: {VEC_PATH}")
-    index = faiss.read_index(str(VEC_PATH))
+    index = _get_index()
     q = embed_texts_ollama([query], model=emb_model)
     q = _normalize(q)
     D, I = index.search(q, k)  # I: FAISS labels (doc_id_i), D: scores (IP ~ cosine)
@@ -36,30 +65,18 @@ def _dense_search(query: str, k: int, emb_model: str) -> List[Tuple[int, float]]
 def _sparse_search(query: str, k: int) -> List[Tuple[int, float]]:
     if not DB_PATH.exists():
         raise FileNotFoundError(f"SQLite DB missing: {DB_PATH}")
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    try:
-        fts_q = expand_fts_query(query, for_prefix=True)
-        rows = cur.execute(
-            "SELECT rowid, bm25(docs_fts, 5.0,8.0,2.0,1.0,0.1) AS r "
-            "FROM docs_fts WHERE docs_fts MATCH ? ORDER BY r LIMIT ?",
-            (fts_q, k),
-        ).fetchall()
-    except sqlite3.OperationalError:
-        rows = cur.execute(
-            "SELECT rowid, rank FROM docs_fts WHERE docs_fts MATCH ? ORDER BY rank LIMIT ?",
-            (query, k),
-        ).fetchall()
-    # Map rowid -> doc_id_i
-    out: List[Tuple[int, float]] = []
-    for rowid, score in rows:
-        did_i = cur.execute(
-            "SELECT doc_id_i FROM docs WHERE rowid=?", (rowid,)
-        ).fetchone()
-        if did_i and did_i[0] is not None:
-            out.append((int(did_i[0]), float(score) if score is not None else 0.0))
-    con.close()
-    return out
+    fts_q = expand_fts_query(query, for_prefix=True)
+    with _CON_LOCK:
+        con = _get_con()
+        try:
+            rows = con.execute(_SQL_SPARSE, (fts_q, k)).fetchall()
+        except sqlite3.OperationalError:
+            rows = con.execute(_SQL_SPARSE_FALLBACK, (query, k)).fetchall()
+    return [
+        (int(did_i), float(score) if score is not None else 0.0)
+        for did_i, score in rows
+        if did_i is not None
+    ]
 
 
 def _rrf(
@@ -75,13 +92,13 @@ def _rrf(
 def _fetch_docs_by_ids(doc_id_is: List[int]) -> Dict[int, dict]:
     if not doc_id_is:
         return {}
-    con = sqlite3.connect(DB_PATH)
     qmarks = ",".join("?" for _ in doc_id_is)
-    rows = con.execute(
-        f"SELECT doc_id_i, doc_id, path, title, tags, caption, excerpt FROM docs WHERE doc_id_i IN ({qmarks})",
-        doc_id_is,
-    ).fetchall()
-    con.close()
+    with _CON_LOCK:
+        con = _get_con()
+        rows = con.execute(
+            f"SELECT doc_id_i, doc_id, path, title, tags, caption, excerpt FROM docs WHERE doc_id_i IN ({qmarks})",
+            doc_id_is,
+        ).fetchall()
     out = {}
     for did_i, did, path, title, tags, caption, excerpt in rows:
         out[int(did_i)] = {
@@ -1,95 +1,406 @@
 # image_utils.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
+import numpy as np
+from fs_ops import scratch_dir
+import multiprocessing
+import io
 import tempfile
+import threading
 import os
 
+try:  # OpenCV: SIMD resize kernels + libjpeg-turbo; Pillow is the fallback
+    import cv2
+except ImportError:
+    cv2 = None
+try:  # optional: libjpeg-turbo decode/encode for in-memory JPEGs
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
 
-def resize_image_to_max_dimension(
-    image_path: Path, max_dimension: int = 1024, quality: int = 95
-) -> Tuple[Path, callable]:
+OPENAI_TILE = 512  # OpenAI vision: images are billed per 512px tile
+OPENAI_TILE_SLIVER = 0.25  # drop a last partial tile up to this fraction
+OPENAI_HIGH_FIT = 2048  # high detail: API fits images into 2048x2048 ...
+OPENAI_HIGH_SHORT = 768  # ... then scales the shortest side down to 768
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool for resizing (created on first use)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: callers are multi-threaded, fork would copy held locks
+            _POOL = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def vision_max_dimension(
+    width: int, height: int, max_dimension: int, target: Optional[str] = None
+) -> int:
     """
-    Resize an image to at most max_dimension on the longest side.
+    Longest side to resize to for a given vision target:
+      None          -> max_dimension
+      "openai-low"  -> at most 512 (one low-detail tile)
+      "openai-high" -> max_dimension, shrunk so no side ends in a thin
+                       partial 512px tile (each started tile costs tokens)
+    For "openai-high" the API itself first fits the image into
+    OPENAI_HIGH_FIT, then scales the shortest side down to OPENAI_HIGH_SHORT
+    and counts tiles on that size. Images it rescales keep max_dimension:
+    their tile grid only depends on the aspect ratio, shrinking them first
+    saves no tiles.
+    """
+    if target == "openai-low":
+        return min(max_dimension, OPENAI_TILE)
+    longest = max(width, height)
+    if target != "openai-high" or longest <= 0:
+        return max_dimension
+    scale = min(1.0, max_dimension / longest)
+    w, h = width * scale, height * scale
+    if max(w, h) > OPENAI_HIGH_FIT or min(w, h) > OPENAI_HIGH_SHORT:
+        return max_dimension
+    # caps from the original sides; repeat until no side (at the final
+    # scale) ends in a sliver, shrinking one side can push the other into one
+    while True:
+        capped = scale
+        for dim in (width, height):
+            tiles = dim * scale / OPENAI_TILE
+            full = int(tiles)
+            if full >= 1 and 0 < tiles - full <= OPENAI_TILE_SLIVER:
+                capped = min(capped, full * OPENAI_TILE / dim)
+        if capped == scale:
+            break
+        scale = capped
+    return max(1, int(longest * scale + 1e-6))
 
-    Args:
-        image_path: path to the original image file
-        max_dimension: maximum dimension in pixels (default: 1024)
-        quality: JPEG quality for output (default: 95)
 
-    Returns:
-        (temporary path to resized image, cleanup function)
+def _resize_to_file(
+    image_path: str,
+    max_dimension: int,
+    quality: int,
+    out_path: str,
+    target: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Resize one image and save it to out_path (suffix may switch to .jpg).
+    Returns the resized path, or None if no resize is needed (or it failed).
+    Top-level function so it can run in the process pool.
+    """
+    return _resize_image(
+        image_path,
+        Path(image_path).suffix.lower(),
+        max_dimension,
+        quality,
+        out_path,
+        target,
+    )
+
+
+def _resize_blob_to_file(
+    data: bytes,
+    max_dimension: int,
+    quality: int,
+    out_path: str,
+    target: Optional[str] = None,
+) -> str:
+    """
+    Like _resize_to_file, but for in-memory image bytes (suffix taken from
+    out_path). Always returns a file: resized, or the bytes written unchanged.
     """
+    resized = _resize_image(
+        data, Path(out_path).suffix.lower(), max_dimension, quality, out_path, target
+    )
+    if resized is None:
+        Path(out_path).write_bytes(data)
+        return out_path
+    return resized
+
+
+def _resize_image(
+    src: Union[str, bytes],
+    suffix: str,
+    max_dimension: int,
+    quality: int,
+    out_path: str,
+    target: Optional[str] = None,
+) -> Optional[str]:
+    """src is a file path or the encoded image bytes."""
+    image_path = Path(src) if isinstance(src, str) else Path(out_path).name
+    temp_path = Path(out_path)
     try:
-        with Image.open(image_path) as img:
-            # current dimensions
+        # header only: cheap size check before any full decode
+        with Image.open(_pil_source(src)) as img:
             width, height = img.size
+        max_dimension = vision_max_dimension(width, height, max_dimension, target)
+        if width <= max_dimension and height <= max_dimension:
+            return None
 
-            # check if resizing is necessary
-            if width <= max_dimension and height <= max_dimension:
-                # no resize needed, return original
-                return image_path, lambda: None
+        if cv2 is not None:
+            resized = _resize_cv2(src, suffix, width, height, max_dimension, quality)
+            if resized is not None:
+                ext, data = resized
+                if ext != temp_path.suffix.lower():
+                    temp_path = temp_path.with_suffix(ext)
+                temp_path.write_bytes(data)
+                return str(temp_path)
 
-            # preserve aspect ratio
-            if width > height:
-                new_width = max_dimension
-                new_height = int(height * (max_dimension / width))
-            else:
-                new_height = max_dimension
-                new_width = int(width * (max_dimension / height))
+        # Pillow fallback (no OpenCV, or a format cv2 cannot decode)
+        with Image.open(_pil_source(src)) as img:
+            # JPEG: let libjpeg decode at 1/2, 1/4, 1/8 scale (DCT scaling)
+            if img.format == "JPEG":
+                img.draft(None, (max_dimension, max_dimension))
 
-            # resize
-            resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # in-place, aspect ratio preserved; reducing_gap uses a fast
+            # BOX pre-reduction before the final LANCZOS pass
+            img.thumbnail(
+                (max_dimension, max_dimension),
+                Image.Resampling.LANCZOS,
+                reducing_gap=2.0,
+            )
 
-            # create temporary file
-            temp_dir = tempfile.mkdtemp(prefix="docsort_resized_")
-            temp_path = Path(temp_dir) / f"resized_{image_path.name}"
-
-            # save resized image
-            if image_path.suffix.lower() in [".jpg", ".jpeg"]:
-                resized_img.save(temp_path, "JPEG", quality=quality, optimize=True)
-            elif image_path.suffix.lower() == ".png":
-                resized_img.save(temp_path, "PNG", optimize=True)
+            # save resized image (no optimize pass: previews are short-lived)
+            if suffix in [".jpg", ".jpeg"]:
+                img.save(temp_path, "JPEG", quality=quality, optimize=False)
+            elif suffix == ".png":
+                img.save(temp_path, "PNG", optimize=False)
             else:
                 # fallback to JPEG for other formats
                 temp_path = temp_path.with_suffix(".jpg")
-                resized_img.save(temp_path, "JPEG", quality=quality, optimize=True)
-
-            # define cleanup function
-            def cleanup():
-                try:
-                    if temp_path.exists():
-                        temp_path.unlink()
-                    if temp_dir and os.path.exists(temp_dir):
-                        # remove all files in directory, if present
-                        for file_path in Path(temp_dir).glob("*"):
-                            try:
-                                if file_path.is_file():
-                                    file_path.unlink()
-                            except Exception:
-                                pass
-                        os.rmdir(temp_dir)
-                except Exception:
-                    pass
-
-            return temp_path, cleanup
+                img.save(temp_path, "JPEG", quality=quality, optimize=False)
+            return str(temp_path)
 
     except Exception as e:
         # on failure, return original
         print(f"Warning: image resize failed for {image_path}: {e}")
+        return None
+
+
+def _pil_source(src: Union[str, bytes]):
+    return src if isinstance(src, str) else io.BytesIO(src)
+
+
+def _resize_cv2(
+    src: Union[str, bytes],
+    suffix: str,
+    width: int,
+    height: int,
+    max_dimension: int,
+    quality: int,
+) -> Optional[Tuple[str, bytes]]:
+    """
+    Decode, INTER_AREA downscale and encode with OpenCV.
+    Returns (suffix, encoded bytes), or None if cv2 cannot decode the file.
+    """
+    if suffix in (".jpg", ".jpeg"):
+        # decoder-side 1/2, 1/4, 1/8 scaling while staying >= max_dimension
+        flag = cv2.IMREAD_COLOR
+        longest = max(width, height)
+        for factor, reduced in (
+            (8, cv2.IMREAD_REDUCED_COLOR_8),
+            (4, cv2.IMREAD_REDUCED_COLOR_4),
+            (2, cv2.IMREAD_REDUCED_COLOR_2),
+        ):
+            if longest // factor >= max_dimension:
+                flag = reduced
+                break
+    else:
+        # keep alpha / bit depth for PNG and friends
+        flag = cv2.IMREAD_UNCHANGED
+    img = None
+    if isinstance(src, str):
+        img = cv2.imread(src, flag)
+    else:
+        if simplejpeg is not None and src[:2] == b"\xff\xd8":
+            img = _decode_jpeg_blob(src, width, height, max_dimension)
+        if img is None:
+            img = cv2.imdecode(np.frombuffer(src, dtype=np.uint8), flag)
+    if img is None:
+        return None
+
+    h, w = img.shape[:2]
+    scale = max_dimension / max(h, w)
+    if scale < 1.0:
+        img = cv2.resize(
+            img,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    if suffix == ".png":
+        ext, params = ".png", [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    else:
+        # fallback to JPEG for other formats
+        ext, params = ".jpg", [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        if simplejpeg is not None and img.ndim == 3 and img.shape[2] == 3:
+            data = simplejpeg.encode_jpeg(
+                np.ascontiguousarray(img), quality=quality, colorspace="BGR"
+            )
+            return (suffix if suffix in (".jpg", ".jpeg") else ext), data
+    ok, buf = cv2.imencode(ext, img, params)
+    if not ok:
+        return None
+    return (suffix if suffix in (".jpg", ".jpeg") else ext), buf.tobytes()
+
+
+def _decode_jpeg_blob(
+    data: bytes, width: int, height: int, max_dimension: int
+) -> Optional[np.ndarray]:
+    """
+    libjpeg-turbo decode (simplejpeg) straight from memory, with DCT scaling
+    down to the smallest size whose longest side is still >= max_dimension.
+    """
+    if width >= height:
+        limits = {"min_width": max_dimension}
+    else:
+        limits = {"min_height": max_dimension}
+    try:
+        return simplejpeg.decode_jpeg(data, colorspace="BGR", **limits)
+    except ValueError:  # CMYK/progressive oddities: let cv2 try
+        return None
+
+
+def encode_pixels(
+    samples: bytes,
+    width: int,
+    height: int,
+    channels: int,
+    stride: int,
+    max_dimension: int = 1024,
+    quality: int = 95,
+    target: Optional[str] = None,
+) -> bytes:
+    """
+    Raw 8-bit RGB/RGBA/gray pixels (e.g. PyMuPDF pix.samples) -> JPEG bytes,
+    downscaled first, so the only encode happens at the final size.
+    """
+    max_dimension = vision_max_dimension(width, height, max_dimension, target)
+    scale = min(1.0, max_dimension / max(width, height, 1))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if cv2 is None:
+        mode = {1: "L", 3: "RGB", 4: "RGBA"}[channels]
+        img = Image.frombuffer(mode, (width, height), samples, "raw", mode, stride)
+        img = img.convert("RGB") if mode == "RGBA" else img
+        if scale < 1.0:
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality, optimize=False)
+        return out.getvalue()
+
+    arr = np.frombuffer(samples, dtype=np.uint8).reshape(height, stride)
+    arr = arr[:, : width * channels].reshape(height, width, channels)
+    if scale < 1.0:
+        arr = cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
+    arr = arr.reshape(arr.shape[0], arr.shape[1], channels)  # cv2 drops 1-ch axis
+    if channels == 1:
+        colorspace = "GRAY"
+    else:
+        if channels == 4:
+            arr = cv2.cvtColor(arr, cv2.COLOR_RGBA2RGB)
+        colorspace = "RGB"
+    if simplejpeg is not None:
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(arr), quality=quality, colorspace=colorspace
+        )
+    if colorspace == "RGB":
+        arr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+    ok, buf = cv2.imencode(".jpg", arr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encode failed")
+    return buf.tobytes()
+
+
+def write_image_blobs(blobs: list[Tuple[str, bytes]]) -> Tuple[list[str], callable]:
+    """
+    Write already sized, encoded images ((name, bytes) pairs) into one temp
+    directory. Returns (list of image paths, cleanup function).
+    """
+    if not blobs:
+        return [], lambda: None
+
+    workdir_obj = tempfile.TemporaryDirectory(
+        prefix="docsort_resized_", dir=scratch_dir()
+    )
+    workdir = Path(workdir_obj.name)
+    paths = []
+    for i, (name, data) in enumerate(blobs):
+        out = workdir / f"{i}_{Path(name).name}"
+        out.write_bytes(data)
+        paths.append(str(out))
+
+    def cleanup():
+        try:
+            workdir_obj.cleanup()
+        except Exception:
+            pass
+
+    return paths, cleanup
+
+
+def resize_image_to_max_dimension(
+    image_path: Path,
+    max_dimension: int = 1024,
+    quality: int = 95,
+    workdir: Optional[Path] = None,
+) -> Tuple[Path, callable]:
+    """
+    Resize an image to at most max_dimension on the longest side.
+
+    Args:
+        image_path: path to the original image file
+        max_dimension: maximum dimension in pixels (default: 1024)
+        quality: JPEG quality for output (default: 95)
+        workdir: directory for the output; owned by the caller (no cleanup).
+            If omitted, a temp directory is created and removed by cleanup.
+
+    Returns:
+        (temporary path to resized image, cleanup function)
+    """
+    tmp = None
+    if workdir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="docsort_resized_", dir=scratch_dir())
+        workdir = Path(tmp.name)
+    resized = _resize_to_file(
+        str(image_path),
+        max_dimension,
+        quality,
+        str(workdir / f"resized_{image_path.name}"),
+    )
+    cleanup = tmp.cleanup if tmp is not None else (lambda: None)
+    if resized is None:
+        # no resize needed (or failed), return original
+        cleanup()
         return image_path, lambda: None
+    return Path(resized), cleanup
 
 
 def resize_images_batch(
-    image_paths: list[str], max_dimension: int = 1024
+    image_paths: list[str],
+    max_dimension: int = 1024,
+    quality: int = 95,
+    target: Optional[str] = None,
 ) -> Tuple[list[str], callable]:
     """
     Resize a list of images to at most max_dimension.
+    Several images are resized in parallel in a process pool; all outputs
+    go into one temp directory that the returned cleanup removes.
 
     Args:
         image_paths: list of image paths
         max_dimension: maximum dimension in pixels (default: 1024)
+        quality: JPEG quality for output (default: 95)
+        target: vision target ("openai-low" / "openai-high"), see
+            vision_max_dimension
 
     Returns:
         (list of resized image paths, cleanup function)
@@ -97,23 +408,79 @@ def resize_images_batch(
     if not image_paths:
         return [], lambda: None
 
-    resized_paths = []
-    cleanup_functions = []
+    workdir_obj = tempfile.TemporaryDirectory(
+        prefix="docsort_resized_", dir=scratch_dir()
+    )
+    workdir = Path(workdir_obj.name)
+    args = [
+        (str(p), max_dimension, quality, str(workdir / f"{i}_{Path(p).name}"), target)
+        for i, p in enumerate(image_paths)
+    ]
+    if len(args) == 1:
+        results = [_resize_to_file(*args[0])]
+    else:
+        try:
+            pool = _get_pool()
+            futures = [pool.submit(_resize_to_file, *a) for a in args]
+            results = [f.result() for f in futures]
+        except BrokenProcessPool:
+            results = [_resize_to_file(*a) for a in args]
 
-    for img_path in image_paths:
-        resized_path, cleanup = resize_image_to_max_dimension(
-            Path(img_path), max_dimension
-        )
-        # Sicherstellen, dass der Pfad als String zurückgegeben wird
-        resized_paths.append(str(resized_path))
-        cleanup_functions.append(cleanup)
+    # Sicherstellen, dass der Pfad als String zurückgegeben wird
+    resized_paths = [
+        r if r is not None else str(p) for p, r in zip(image_paths, results)
+    ]
 
-    # combined cleanup
+    # single cleanup for the whole batch
     def combined_cleanup():
-        for cleanup in cleanup_functions:
-            try:
-                cleanup()
-            except Exception:
-                pass
+        try:
+            workdir_obj.cleanup()
+        except Exception:
+            pass
 
     return resized_paths, combined_cleanup
+
+
+def resize_image_blobs(
+    blobs: list[Tuple[str, bytes]],
+    max_dimension: int = 1024,
+    quality: int = 95,
+    target: Optional[str] = None,
+) -> Tuple[list[str], callable]:
+    """
+    Like resize_images_batch, but for images that are only in memory
+    (e.g. embedded in a pptx): (name, bytes) pairs are decoded directly,
+    without writing the originals to disk first. Images that need no resize
+    are written unchanged. All outputs go into one temp directory.
+
+    Returns:
+        (list of image paths, cleanup function)
+    """
+    if not blobs:
+        return [], lambda: None
+
+    workdir_obj = tempfile.TemporaryDirectory(
+        prefix="docsort_resized_", dir=scratch_dir()
+    )
+    workdir = Path(workdir_obj.name)
+    args = [
+        (data, max_dimension, quality, str(workdir / f"{i}_{Path(name).name}"), target)
+        for i, (name, data) in enumerate(blobs)
+    ]
+    if len(args) == 1:
+        paths = [_resize_blob_to_file(*args[0])]
+    else:
+        try:
+            pool = _get_pool()
+            futures = [pool.submit(_resize_blob_to_file, *a) for a in args]
+            paths = [f.result() for f in futures]
+        except BrokenProcessPool:
+            paths = [_resize_blob_to_file(*a) for a in args]
+
+    def cleanup():
+        try:
+            workdir_obj.cleanup()
+        except Exception:
+            pass
+
+    return paths, cleanup
@@ -1,8 +1,10 @@
 # index_store.py
 from __future__ import annotations
-import json, sqlite3, faiss, numpy as np
+import atexit, hashlib, json, os, queue, sqlite3, struct, threading, time, faiss, numpy as np
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
+
+from filelock import FileLock
 
 from search_normalize import de_variants
 
@@ -10,13 +12,36 @@ DB_PATH = Path("./search/docs.sqlite")
 VEC_PATH = Path("./search/vec.faiss")
 BASE = DB_PATH.parent
 BASE.mkdir(parents=True, exist_ok=True)
+VEC_CACHE_MAX_ROWS = 50_000  # least recently used embeddings are evicted beyond this
 
 
 # -----------------------------
 # SQLite (docs + FTS5)
 # -----------------------------
-def _connect():
-    con = sqlite3.connect(DB_PATH)
+# One long-lived connection per process (WAL), shared by all threads.
+# _DB_LOCK serializes access so transactions of different threads do not mix.
+_DB_LOCK = threading.RLock()
+_CON: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _CON
+    with _DB_LOCK:
+        if _CON is None:
+            # IMMEDIATE: take the write lock at BEGIN, not on the first write
+            _CON = _init_db(
+                sqlite3.connect(
+                    DB_PATH, check_same_thread=False, isolation_level="IMMEDIATE"
+                )
+            )
+        return _CON
+
+
+def _init_db(con: sqlite3.Connection) -> sqlite3.Connection:
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA mmap_size=268435456")  # 256 MiB
     # docs: doc_id = SHA256 hex, doc_id_i = i64 (first 8 bytes)
     con.execute(
         """
@@ -38,9 +63,67 @@ def _connect():
         prefix='2 3 4'
     )"""
     )
+    # path lookups (watcher events) answered from the index alone
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_docs_path_covering ON docs(path, doc_id, doc_id_i)"
+    )
+    # llm_cache: classification result per (content, model, taxonomy, prompt)
+    con.execute(
+        """
+    CREATE TABLE IF NOT EXISTS llm_cache(
+      key           TEXT PRIMARY KEY,
+      response_json BLOB,
+      ts            INTEGER
+    )"""
+    )
+    # vec_cache: L2-normalized embedding per sha256(model + representation text)
+    con.execute(
+        """
+    CREATE TABLE IF NOT EXISTS vec_cache(
+      rep_hash  TEXT PRIMARY KEY,
+      vec       BLOB,
+      last_used INTEGER
+    )"""
+    )
+    # stat_hash: content hash per file signature (watcher skips re-hashing)
+    con.execute(
+        """
+    CREATE TABLE IF NOT EXISTS stat_hash(
+      dev      INTEGER,
+      ino      INTEGER,
+      size     INTEGER,
+      mtime_ns INTEGER,
+      sha      TEXT,
+      ctime_ns INTEGER,
+      PRIMARY KEY(dev, ino)
+    ) WITHOUT ROWID"""
+    )
+    cols = {r[1] for r in con.execute("PRAGMA table_info(vec_cache)")}
+    if "last_used" not in cols:
+        con.execute("ALTER TABLE vec_cache ADD COLUMN last_used INTEGER")
+    cols = {r[1] for r in con.execute("PRAGMA table_info(stat_hash)")}
+    if "ctime_ns" not in cols:
+        con.execute("ALTER TABLE stat_hash ADD COLUMN ctime_ns INTEGER")
     return con
 
 
+def _fts_upsert_many(
+    con: sqlite3.Connection, rows: List[tuple], existing: Optional[set] = None
+) -> None:
+    """
+    rows: (rowid, title, tags, caption, text, path)
+    existing: rowids that may already be in docs_fts (None = all of them);
+    brand-new rowids skip the DELETE probe.
+    """
+    stale = [(r[0],) for r in rows if existing is None or r[0] in existing]
+    if stale:
+        con.executemany("DELETE FROM docs_fts WHERE rowid=?", stale)
+    con.executemany(
+        "INSERT INTO docs_fts(rowid,title,tags,caption,text,path) VALUES (?,?,?,?,?,?)",
+        rows,
+    )
+
+
 def _fts_upsert(
     con: sqlite3.Connection,
     rowid: int,
@@ -60,38 +143,244 @@ def _fts_upsert(
 # -----------------------------
 # ID conversion (SHA256 -> i64)
 # -----------------------------
+_I64 = struct.Struct(">q")
+
+
 def sha256_to_i64(sha_hex: str) -> int:
     """
-    Take the first 8 bytes (16 hex chars) of the SHA256 and map
-    them to a signed int64 (two's complement if needed).
+    Take the first 8 bytes (16 hex chars) of the SHA256 and read them
+    as a big-endian signed int64 (fits SQLite INTEGER and FAISS ids).
+    Prefixed content ids ("blake3:<hex>") use the digest after the prefix.
     """
-    v = int(sha_hex[:16], 16)  # 0 .. 2^64-1  (unsigned)
-    if v >= (1 << 63):  # in signed-Bereich mappen
-        v -= 1 << 64  # Two's-complement
-    return v  # passt in SQLite INTEGER (signed 64-bit)
+    return _I64.unpack(bytes.fromhex(sha_hex.rpartition(":")[2][:16]))[0]
 
 
 # -----------------------------
-# FAISS index (IDMap2 over IndexFlatIP)
+# FAISS index (IDMap2 over IndexFlatIP | SQ8 | HNSW)
 # -----------------------------
+# Index type for new/rebuilt indexes:
+#   "flat" – exact float32 search (default, fine up to ~10k docs)
+#   "sq8"  – int8 scalar quantizer, 4x smaller on disk/in RAM
+#   "hnsw" – graph index, O(log N) search for large libraries
+INDEX_KIND = os.getenv("DOCSORT_INDEX_KIND", "flat")
+HNSW_M = 32
+
+
+def _new_index(dim: int, kind: str = INDEX_KIND):
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)  # IP + normalization = cosine
+    elif kind == "sq8":
+        base = faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        # vectors are L2-normalized -> every component lies in [-1, 1]
+        base.train(np.stack([-np.ones(dim), np.ones(dim)]).astype("float32"))
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown index kind: {kind!r}")
+    return faiss.IndexIDMap2(base)  # stable 64-bit IDs
+    # Docs: add_with_ids / remove_ids / reconstruct via IDMap2.  # noqa
+    # https://faiss.ai/cpp_api/file/IndexIDMap_8h.html | https://faiss.ai/cpp_api/struct/structfaiss_1_1IndexIDMap2Template.html
+
+
 def _open_index(dim: Optional[int] = None):
     if VEC_PATH.exists():
         return faiss.read_index(str(VEC_PATH))
     if dim is None:
         raise ValueError("Initial build requires 'dim'.")
-    base = faiss.IndexFlatIP(dim)  # IP + normalization = cosine
-    return faiss.IndexIDMap2(base)  # stable 64-bit IDs
-    # Docs: add_with_ids / remove_ids / reconstruct via IDMap2.  # noqa
-    # https://faiss.ai/cpp_api/file/IndexIDMap_8h.html | https://faiss.ai/cpp_api/struct/structfaiss_1_1IndexIDMap2Template.html
+    return _new_index(dim)
+
+
+def _index_kind(index) -> str:
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def _all_vectors(index) -> Tuple[np.ndarray, np.ndarray]:
+    """(vectors, ids) currently stored in an IDMap2 index."""
+    base = faiss.downcast_index(index.index)
+    ids = faiss.vector_to_array(index.id_map).astype("int64")
+    if base.ntotal == 0:
+        return np.zeros((0, base.d), dtype="float32"), ids
+    return base.reconstruct_n(0, base.ntotal), ids
+
+
+def _remove_ids(index, ids: np.ndarray):
+    """remove_ids that also works for HNSW (no native removal -> rebuild without ids)."""
+    if _index_kind(index) != "hnsw":
+        ids = np.ascontiguousarray(ids, dtype="int64")
+        # IDSelectorBatch: hashed membership test, one pass over the id map
+        index.remove_ids(faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)))
+        return index
+    vecs, have = _all_vectors(index)
+    keep = ~np.isin(have, ids)
+    if keep.all():
+        return index
+    rebuilt = _new_index(index.d, "hnsw")
+    rebuilt.add_with_ids(vecs[keep], have[keep])
+    return rebuilt
 
 
 def _save_index(index) -> None:
-    faiss.write_index(index, str(VEC_PATH))
+    # write to a temp file first, then atomically replace (crash-safe)
+    tmp = VEC_PATH.with_name(VEC_PATH.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, VEC_PATH)
+
+
+# watcher, web UI and main.py are separate processes writing the same file
+_VEC_LOCK = FileLock(str(VEC_PATH.with_name(VEC_PATH.name + ".lock")))
+
+
+def _vec_sig() -> Optional[tuple]:
+    """Identity of vec.faiss on disk (changes with every save), None if missing."""
+    try:
+        st = os.stat(VEC_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _apply(index, op: tuple):
+    """Apply one journaled change ("add", vecs, ids) | ("remove", ids)."""
+    if op[0] == "add":
+        _, vecs, ids = op
+        index = _remove_ids(index, ids)
+        # add_with_ids: stable 64-bit IDs, whole batch in one call
+        index.add_with_ids(vecs, ids)
+        return index
+    return _remove_ids(index, op[1])
+
+
+class IndexStore:
+    """
+    FAISS index held in memory (loaded lazily on first use).
+    Changes are written back by flush(): every `flush_every` updates,
+    `flush_interval_s` seconds after the first unsaved change, and at exit.
+    Unsaved changes are also kept as a journal: if another process saved
+    vec.faiss in the meantime, flush() reloads it and replays the journal
+    on top (under a cross-process file lock) instead of overwriting it.
+    """
+
+    def __init__(self, *, flush_every: int = 64, flush_interval_s: float = 30.0):
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self._index = None
+        self._sig: Optional[tuple] = None  # _vec_sig() of the loaded/saved file
+        self._journal: List[tuple] = []  # changes since last flush
+        self._pending = 0  # updates since last flush
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+    def _get(self, dim: Optional[int] = None):
+        if self._index is None:
+            self._load(dim)
+        elif not self._journal:
+            # nothing unsaved: pick up saves of other processes
+            sig = _vec_sig()
+            if sig is not None and sig != self._sig:
+                self._load(dim)
+        return self._index
+
+    def _load(self, dim: Optional[int] = None) -> None:
+        self._sig = _vec_sig()
+        self._index = _open_index(dim=dim)
+
+    def add(self, vecs: np.ndarray, ids: np.ndarray) -> None:
+        """Add (or replace) vectors under the given int64 ids."""
+        with self._lock:
+            vecs = np.ascontiguousarray(vecs, dtype="float32")
+            ids = np.ascontiguousarray(ids, dtype="int64")
+            op = ("add", vecs, ids)
+            self._index = _apply(self._get(dim=vecs.shape[1]), op)
+            self._journal.append(op)
+            self._changed(len(ids))
+
+    def remove(self, ids: np.ndarray) -> None:
+        with self._lock:
+            if self._index is None and not VEC_PATH.exists():
+                return
+            op = ("remove", np.ascontiguousarray(ids, dtype="int64"))
+            self._index = _apply(self._get(), op)
+            self._journal.append(op)
+            self._changed(len(ids))
+
+    def flush(self) -> None:
+        """Write the index to disk if there are unsaved changes."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._journal and self._index is not None:
+                with _VEC_LOCK:
+                    if _vec_sig() != self._sig:
+                        # saved by another process since we loaded it
+                        self._index = self._replay()
+                    _save_index(self._index)
+                    self._sig = _vec_sig()
+            self._journal.clear()
+            self._pending = 0
+
+    def _replay(self):
+        """Current vec.faiss (or an empty index) plus the journaled changes."""
+        if VEC_PATH.exists():
+            index = faiss.read_index(str(VEC_PATH))
+        else:
+            index = _new_index(self._index.d, _index_kind(self._index))
+        for op in self._journal:
+            index = _apply(index, op)
+        return index
+
+    def rebuild(self, kind: str) -> int:
+        """Re-add all vectors into a new index of the given kind; returns the count."""
+        with self._lock, _VEC_LOCK:
+            self.flush()
+            old = self._get()
+            vecs, ids = _all_vectors(old)
+            index = _new_index(old.d, kind)
+            if len(ids):
+                index.add_with_ids(vecs, ids)
+            self._index = index
+            _save_index(index)
+            self._sig = _vec_sig()
+            return len(ids)
+
+    def _changed(self, n: int) -> None:
+        self._pending += n
+        if self._pending >= self.flush_every:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_interval_s, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+_STORE = IndexStore()
+atexit.register(_STORE.flush)
+
+
+def get_index_store() -> IndexStore:
+    return _STORE
+
+
+def rebuild_index(kind: str = INDEX_KIND) -> int:
+    """Migrate vec.faiss to another index kind ("flat" | "sq8" | "hnsw")."""
+    return _STORE.rebuild(kind)
 
 
 def _normalize(X: np.ndarray) -> np.ndarray:
-    X = X.astype("float32")
-    X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    """L2-normalize rows (in place where possible); unit rows are returned as-is."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", X, X))  # one pass, no temporary matrix
+    if np.allclose(norms, 1.0, atol=1e-4):
+        # embedder already returns unit vectors (e.g. bge-m3)
+        return X
+    X /= norms[:, None] + 1e-12
     return X
 
 
@@ -108,77 +397,361 @@ def upsert_document(
     excerpt: str,
     represent_text: str,  # WICHTIG: OHNE Pfad!
     embed_fn,  # callable: List[str] -> np.ndarray (1 x dim), unnormalisiert ok
+    embed_model: str = "",  # namespace for the embedding cache
 ) -> None:
     """Upsert into SQLite (docs + FTS5) and FAISS (IDMap2)."""
-    doc_id_i = sha256_to_i64(doc_id)
+    upsert_documents_batch(
+        [
+            {
+                "doc_id": doc_id,
+                "final_path": final_path,
+                "title": title,
+                "tags": tags,
+                "caption": caption,
+                "excerpt": excerpt,
+                "represent_text": represent_text,
+            }
+        ],
+        embed_fn=embed_fn,
+        embed_model=embed_model,
+    )
+
 
-    # 1) SQLite upsert
+def upsert_documents_batch(
+    docs: List[dict], *, embed_fn, embed_model: str = ""
+) -> None:
+    """
+    Upsert many documents at once: one SQLite transaction, one embed_fn call
+    (N texts -> N x dim) and one FAISS update for the whole batch.
+    Each doc carries the keyword arguments of upsert_document (without embed_fn).
+    """
+    # last occurrence wins if the same content shows up twice in one batch
+    docs = list({d["doc_id"]: d for d in docs}.values())
+    if not docs:
+        return
+    ids = [sha256_to_i64(d["doc_id"]) for d in docs]
+
+    # 1) SQLite upsert (single transaction)
     con = _connect()
-    con.execute(
-        """
-        INSERT INTO docs(doc_id, doc_id_i, path, title, tags, caption, excerpt)
-        VALUES(?,?,?,?,?,?,?)
-        ON CONFLICT(doc_id) DO UPDATE SET
-          doc_id_i=excluded.doc_id_i,
-          path=excluded.path, title=excluded.title, tags=excluded.tags,
-          caption=excluded.caption, excerpt=excluded.excerpt
-    """,
-        (doc_id, doc_id_i, final_path, title, " ".join(tags), caption or "", excerpt),
-    )
-    rowid = con.execute("SELECT rowid FROM docs WHERE doc_id=?", (doc_id,)).fetchone()[
-        0
+    qmarks = ",".join("?" for _ in docs)
+    doc_ids = [d["doc_id"] for d in docs]
+    with _DB_LOCK, con:
+        # rows present before the upsert keep their rowid -> need an FTS delete
+        existing = {
+            r[0]
+            for r in con.execute(
+                f"SELECT rowid FROM docs WHERE doc_id IN ({qmarks})", doc_ids
+            )
+        }
+        con.executemany(
+            """
+            INSERT INTO docs(doc_id, doc_id_i, path, title, tags, caption, excerpt)
+            VALUES(?,?,?,?,?,?,?)
+            ON CONFLICT(doc_id) DO UPDATE SET
+              doc_id_i=excluded.doc_id_i,
+              path=excluded.path, title=excluded.title, tags=excluded.tags,
+              caption=excluded.caption, excerpt=excluded.excerpt
+        """,
+            [
+                (
+                    d["doc_id"],
+                    doc_id_i,
+                    d["final_path"],
+                    d["title"],
+                    " ".join(d["tags"]),
+                    d.get("caption") or "",
+                    d["excerpt"],
+                )
+                for d, doc_id_i in zip(docs, ids)
+            ],
+        )
+        rowids = dict(
+            con.execute(
+                f"SELECT doc_id, rowid FROM docs WHERE doc_id IN ({qmarks})",
+                doc_ids,
+            ).fetchall()
+        )
+        fts_rows = []
+        for d in docs:
+            tags_norm = " ".join(
+                sorted({t for tag in d["tags"] for t in de_variants(tag)})
+            )
+            # also expand title variants for FTS
+            title_norm = " ".join(sorted(de_variants(d["title"])))
+            fts_rows.append(
+                (
+                    rowids[d["doc_id"]],
+                    title_norm,
+                    tags_norm,
+                    d.get("caption") or "",
+                    d["excerpt"],
+                    d["final_path"],
+                )
+            )
+        _fts_upsert_many(con, fts_rows, existing)
+
+    # 2) Embedding (one call for all cache misses) -> FAISS add_with_ids
+    vecs = _embed_cached([d["represent_text"] for d in docs], embed_fn, embed_model)
+    _STORE.add(vecs, np.array(ids, dtype="int64"))
+
+
+def _embed_cached(texts: List[str], embed_fn, embed_model: str) -> np.ndarray:
+    """
+    Normalized embeddings for texts. Cached in vec_cache under
+    sha256(embed_model + text); only misses are passed to embed_fn.
+    """
+    keys = [
+        hashlib.sha256((embed_model + "\0" + t).encode("utf-8")).hexdigest()
+        for t in texts
     ]
-    tags_norm = " ".join(sorted({t for tag in tags for t in de_variants(tag)}))
-    # also expand title variants for FTS
-    title_norm = " ".join(sorted(de_variants(title)))
-    _fts_upsert(con, rowid, title_norm, tags_norm, caption or "", excerpt, final_path)
-    con.commit()
-    con.close()
-
-    # 2) Embedding -> FAISS add_with_ids (remove existing id first)
-    vec = embed_fn([represent_text])  # (1, d)
-    if vec.shape[0] != 1:
-        raise ValueError("embed_fn must return exactly 1 vector")
-    vec = _normalize(vec)
-    index = _open_index(dim=vec.shape[1] if not VEC_PATH.exists() else None)
-    try:
-        index.remove_ids(np.array([doc_id_i], dtype="int64"))
-    except Exception:
-        pass
-    # add_with_ids: stable 64-bit IDs
-    index.add_with_ids(vec.astype("float32"), np.array([doc_id_i], dtype="int64"))
-    _save_index(index)
+    con = _connect()
+    qmarks = ",".join("?" for _ in keys)
+    now = int(time.time())
+    with _DB_LOCK, con:
+        cached = dict(
+            con.execute(
+                f"SELECT rep_hash, vec FROM vec_cache WHERE rep_hash IN ({qmarks})",
+                keys,
+            ).fetchall()
+        )
+        if cached:
+            con.executemany(
+                "UPDATE vec_cache SET last_used=? WHERE rep_hash=?",
+                [(now, k) for k in cached],
+            )
+    missing = [i for i, k in enumerate(keys) if k not in cached]
+    if missing:
+        new = embed_fn([texts[i] for i in missing])
+        if new.shape[0] != len(missing):
+            raise ValueError(f"embed_fn must return exactly {len(missing)} vectors")
+        new = _normalize(new)  # stored normalized: hits need no further work
+        with _DB_LOCK, con:
+            con.executemany(
+                "INSERT OR REPLACE INTO vec_cache(rep_hash, vec, last_used) VALUES (?,?,?)",
+                [(keys[i], row.tobytes(), now) for i, row in zip(missing, new)],
+            )
+            _evict_vec_cache(con)
+        for i, row in zip(missing, new):
+            cached[keys[i]] = row.tobytes()
+    return np.stack([np.frombuffer(cached[k], dtype="float32") for k in keys])
+
+
+def _evict_vec_cache(con: sqlite3.Connection) -> None:
+    (n,) = con.execute("SELECT count(*) FROM vec_cache").fetchone()
+    if n > VEC_CACHE_MAX_ROWS:
+        con.execute(
+            "DELETE FROM vec_cache WHERE rep_hash IN ("
+            " SELECT rep_hash FROM vec_cache ORDER BY last_used LIMIT ?)",
+            (n - VEC_CACHE_MAX_ROWS,),
+        )
+
+
+def llm_cache_get(key: str, max_age_s: Optional[int] = None) -> Optional[dict]:
+    """Cached LLM response for key (None on miss or if older than max_age_s)."""
+    con = _connect()
+    with _DB_LOCK:
+        row = con.execute(
+            "SELECT response_json, ts FROM llm_cache WHERE key=?", (key,)
+        ).fetchone()
+    if not row:
+        return None
+    if max_age_s is not None and int(time.time()) - int(row[1]) > max_age_s:
+        return None
+    return json.loads(row[0])
+
+
+def llm_cache_put(key: str, response: dict) -> None:
+    con = _connect()
+    with _DB_LOCK, con:
+        con.execute(
+            "INSERT OR REPLACE INTO llm_cache(key, response_json, ts) VALUES (?,?,?)",
+            (key, json.dumps(response, ensure_ascii=False), int(time.time())),
+        )
+
+
+def _u64_to_i64(x: int) -> int:
+    # st_dev/st_ino are unsigned 64-bit; SQLite integers are signed
+    return x - (1 << 64) if x >= 1 << 63 else x
+
+
+def stat_hash_get(dev: int, ino: int, size: int, mtime_ns: int) -> Optional[str]:
+    """Stored content hash of a file if size and mtime still match."""
+    con = _connect()
+    with _DB_LOCK:
+        row = con.execute(
+            "SELECT sha FROM stat_hash WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+            (_u64_to_i64(dev), _u64_to_i64(ino), size, mtime_ns),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def stat_hash_lookup(
+    dev: int, ino: int
+) -> Optional[tuple[int, int, Optional[int], str]]:
+    """
+    Last recorded (size, mtime_ns, ctime_ns, hash) of a file, whatever its
+    current stat. ctime_ns is None for rows written before it was recorded.
+    """
+    con = _connect()
+    with _DB_LOCK:
+        row = con.execute(
+            "SELECT size, mtime_ns, ctime_ns, sha FROM stat_hash WHERE dev=? AND ino=?",
+            (_u64_to_i64(dev), _u64_to_i64(ino)),
+        ).fetchone()
+    return tuple(row) if row else None
+
+
+def stat_hash_put(
+    dev: int,
+    ino: int,
+    size: int,
+    mtime_ns: int,
+    sha: str,
+    ctime_ns: Optional[int] = None,
+) -> None:
+    con = _connect()
+    with _DB_LOCK, con:
+        con.execute(
+            "INSERT OR REPLACE INTO stat_hash(dev, ino, size, mtime_ns, sha, ctime_ns)"
+            " VALUES (?,?,?,?,?,?)",
+            (_u64_to_i64(dev), _u64_to_i64(ino), size, mtime_ns, sha, ctime_ns),
+        )
+
+
+class DocumentBatcher:
+    """
+    Background queue for upserts: documents are collected and written via
+    upsert_documents_batch every `max_items` documents or `max_wait_s` seconds,
+    whichever comes first. flush() blocks until everything submitted is indexed.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        *,
+        embed_model: str = "",
+        max_items: int = 16,
+        max_wait_s: float = 2.0,
+    ):
+        self.embed_fn = embed_fn
+        self.embed_model = embed_model
+        self.max_items = max_items
+        self.max_wait_s = max_wait_s
+        self._q: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, **doc) -> None:
+        """Queue one document (keyword arguments of upsert_document without embed_fn)."""
+        self._ensure_worker()
+        self._q.put(doc)
+
+    def flush(self) -> None:
+        """Wait until all queued documents have been written."""
+        if self._thread is not None:
+            self._q.join()
+
+    def _ensure_worker(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="index-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                upsert_documents_batch(
+                    batch, embed_fn=self.embed_fn, embed_model=self.embed_model
+                )
+            except Exception as e:
+                names = ", ".join(Path(d["final_path"]).name for d in batch)
+                print(f"[index][warn] batch upsert failed ({names}): {e}")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
 
 
 def delete_document(doc_id: str) -> None:
     """Remove document from FAISS + SQLite/FTS5."""
     con = _connect()
-    row = con.execute(
-        "SELECT doc_id_i, rowid FROM docs WHERE doc_id=?", (doc_id,)
-    ).fetchone()
-    if not row:
-        con.close()
-        return
-    doc_id_i, rowid = int(row[0]), int(row[1])
-    con.execute("DELETE FROM docs_fts WHERE rowid=?", (rowid,))
-    con.execute("DELETE FROM docs WHERE rowid=?", (rowid,))
-    con.commit()
-    con.close()
+    with _DB_LOCK, con:
+        row = con.execute(
+            "SELECT doc_id_i, rowid FROM docs WHERE doc_id=?", (doc_id,)
+        ).fetchone()
+        if not row:
+            return
+        doc_id_i, rowid = int(row[0]), int(row[1])
+        con.execute("DELETE FROM docs_fts WHERE rowid=?", (rowid,))
+        con.execute("DELETE FROM docs WHERE rowid=?", (rowid,))
 
-    if VEC_PATH.exists():
-        index = faiss.read_index(str(VEC_PATH))
-        index.remove_ids(np.array([doc_id_i], dtype="int64"))
-        _save_index(index)
+    _STORE.remove(np.array([doc_id_i], dtype="int64"))
+
+
+def delete_document_at_path(
+    path: str, keep_doc_id: Optional[str] = None
+) -> Optional[str]:
+    """
+    Remove the document indexed under path, unless it is keep_doc_id
+    (lookup and delete in one transaction). Returns the removed doc_id.
+    """
+    con = _connect()
+    with _DB_LOCK, con:
+        row = con.execute(
+            "SELECT doc_id, doc_id_i, rowid FROM docs WHERE path=?", (path,)
+        ).fetchone()
+        if not row or row[0] == keep_doc_id:
+            return None
+        doc_id, doc_id_i, rowid = row[0], int(row[1]), int(row[2])
+        con.execute("DELETE FROM docs_fts WHERE rowid=?", (rowid,))
+        con.execute("DELETE FROM docs WHERE rowid=?", (rowid,))
+
+    _STORE.remove(np.array([doc_id_i], dtype="int64"))
+    return doc_id
+
+
+def ensure_schema() -> None:
+    """Create tables and indexes now (before other connections read the DB)."""
+    _connect()
 
 
 def update_path_only(doc_id: str, new_path: str) -> None:
     """Update only path in SQLite/FTS5 (no re-embedding)."""
     con = _connect()
-    con.execute("UPDATE docs SET path=? WHERE doc_id=?", (new_path, doc_id))
-    rowid, title, tags, caption, excerpt = con.execute(
-        "SELECT rowid, title, tags, caption, excerpt FROM docs WHERE doc_id=?",
-        (doc_id,),
-    ).fetchone()
-    _fts_upsert(con, rowid, title, tags, caption, excerpt, new_path)
-    con.commit()
-    con.close()
+    with _DB_LOCK, con:
+        con.execute("UPDATE docs SET path=? WHERE doc_id=?", (new_path, doc_id))
+        rowid, title, tags, caption, excerpt = con.execute(
+            "SELECT rowid, title, tags, caption, excerpt FROM docs WHERE doc_id=?",
+            (doc_id,),
+        ).fetchone()
+        _fts_upsert(con, rowid, title, tags, caption, excerpt, new_path)
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Maintenance for the FAISS index")
+    ap.add_argument(
+        "--rebuild",
+        choices=["flat", "sq8", "hnsw"],
+        required=True,
+        help="Rebuild vec.faiss as the given index kind",
+    )
+    args = ap.parse_args()
+    n = rebuild_index(args.rebuild)
+    print(f"[rebuild] {n} vectors -> {args.rebuild} ({VEC_PATH})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,24 @@
 # ingest.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Tuple, List, Callable
+from typing import Tuple, List, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+import functools
+import io
+import multiprocessing
+import os
 import tempfile
+import threading
 
 import docx2txt
-from unstructured.partition.auto import partition
-from image_utils import resize_images_batch
+from image_utils import (
+    encode_pixels,
+    resize_images_batch,
+    resize_image_blobs,
+    write_image_blobs,
+)
+from fs_ops import prefetch_file, scratch_dir
 import fitz
 from pptx import Presentation
 from charset_normalizer import from_bytes
@@ -31,7 +43,13 @@ PDF_RASTER_DPI = 200
 
 
 def is_supported_file(p: Path) -> bool:
-    return p.is_file() and p.suffix.lower() in SUPPORTED_EXTS
+    """By extension only (no stat); callers pass paths known to be files."""
+    return _supported_suffix(p.suffix)
+
+
+@functools.lru_cache(maxsize=4096)
+def _supported_suffix(suffix: str) -> bool:
+    return suffix.lower() in SUPPORTED_EXTS
 
 
 def _truncate(text: str, limit: int = MAX_TEXT_CHARS) -> str:
@@ -39,23 +57,31 @@ def _truncate(text: str, limit: int = MAX_TEXT_CHARS) -> str:
     return text if len(text) <= limit else text[:limit] + "…"
 
 
-def _read_text_safely(path: Path) -> str:
+def _read_text_safely(path: Path, max_chars: int = MAX_TEXT_CHARS) -> str:
     """
-    Read bytes and try, in order:
+    Read a prefix (enough for max_chars, UTF-8 worst case 4 bytes/char)
+    and try, in order:
       1) UTF-8-SIG (removes BOM),
       2) charset-normalizer (best guess),
       3) latin-1 (lossless, never raises DecodeError).
     """
-    data = path.read_bytes()
+    limit = max_chars * 4 + 8
+    with path.open("rb") as f:
+        data = f.read(limit + 1)
+    truncated = len(data) > limit
+    data = data[:limit]
     # 1) Bevorzugt UTF-8 (mit/ohne BOM)
     try:
-        return data.decode("utf-8-sig")
+        # final=False: a multi-byte char cut off at the prefix end is dropped
+        return codecs.getincrementaldecoder("utf-8-sig")().decode(
+            data, final=not truncated
+        )
     except UnicodeDecodeError:
         pass
 
-    # 2) Automatische Erkennung
+    # 2) Automatische Erkennung (a prefix is enough for detection)
     try:
-        match = from_bytes(data).best()
+        match = from_bytes(data[:65536]).best()
         if match and match.encoding:
             return data.decode(match.encoding, errors="replace")
     except Exception:
@@ -65,10 +91,12 @@ def _read_text_safely(path: Path) -> str:
     return data.decode("latin-1", errors="replace")
 
 
-def ingest_image(path: Path) -> Tuple[str, List[str], callable]:
+def ingest_image(
+    path: Path, vision_target: Optional[str] = None
+) -> Tuple[str, List[str], callable]:
     # Resize to MAX_IMAGE_DIMENSION and pass to the model
     resized_paths, cleanup = resize_images_batch(
-        [str(path)], max_dimension=MAX_IMAGE_DIMENSION
+        [str(path)], max_dimension=MAX_IMAGE_DIMENSION, target=vision_target
     )
     return "", resized_paths, cleanup
 
@@ -79,9 +107,11 @@ def ingest_txt(path: Path) -> Tuple[str, List[str], Callable]:
     return _truncate(text), [], (lambda: None)
 
 
-def ingest_docx(path: Path) -> Tuple[str, List[str], callable]:
+def ingest_docx(
+    path: Path, vision_target: Optional[str] = None
+) -> Tuple[str, List[str], callable]:
     # Extract images via docx2txt into a temp directory
-    tmpdir_obj = tempfile.TemporaryDirectory(prefix="docsort_docx_")
+    tmpdir_obj = tempfile.TemporaryDirectory(prefix="docsort_docx_", dir=scratch_dir())
     tmpdir = tmpdir_obj.name
     text = docx2txt.process(str(path), tmpdir)
     images = sorted(Path(tmpdir).glob("*"))
@@ -89,7 +119,7 @@ def ingest_docx(path: Path) -> Tuple[str, List[str], callable]:
 
     # Resize extracted images
     resized_paths, resize_cleanup = resize_images_batch(
-        img_paths, max_dimension=MAX_IMAGE_DIMENSION
+        img_paths, max_dimension=MAX_IMAGE_DIMENSION, target=vision_target
     )
 
     # Combined cleanup
@@ -107,62 +137,152 @@ def ingest_docx(path: Path) -> Tuple[str, List[str], callable]:
 
 
 def ingest_via_unstructured(path: Path) -> Tuple[str, List[str], callable]:
+    # imported lazily: heavy, and PDF pool workers re-import this module
+    from unstructured.partition.auto import partition
+
     els = partition(filename=str(path))
     text = _truncate("\n".join(e.text for e in els if getattr(e, "text", None)))
     return text, [], (lambda: None)
 
 
-def ingest_pdf(path: Path) -> Tuple[str, List[str], Callable]:
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+_PDF_POOL_LOCK = threading.Lock()
+PDF_WORKERS = min(os.cpu_count() or 1, MAX_IMAGES + 1)
+# plain text extraction: no image blocks, hyphenated line breaks joined
+PDF_TEXT_FLAGS = (
+    fitz.TEXT_PRESERVE_WHITESPACE
+    | fitz.TEXT_PRESERVE_LIGATURES
+    | fitz.TEXT_MEDIABOX_CLIP
+    | fitz.TEXT_DEHYPHENATE
+)
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Worker pool for PDF page text/rasterization (created on first use)."""
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            # spawn: callers are multi-threaded, fork would copy held locks
+            _PDF_POOL = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _PDF_POOL
+
+
+def _pdf_page_worker(
+    path_str: str,
+    idx: int,
+    dpi: int,
+    render: bool,
+    max_text_chars: int,
+    target: Optional[str] = None,
+) -> Tuple[int, str, Optional[bytes]]:
     """
-    Extract text with PyMuPDF and raster the first N pages (MAX_IMAGES) as PNGs.
+    Text (at most max_text_chars) and optionally a raster of one page as a
+    JPEG already sized for the model (raw pixmap -> resize -> one encode).
+    Runs in the process pool.
     """
-    tmpdir_obj = tempfile.TemporaryDirectory(prefix="docsort_pdf_")
-    tmpdir = Path(tmpdir_obj.name)
-    texts: List[str] = []
-    images: List[str] = []
+    with fitz.open(path_str) as doc:
+        page = doc[idx]
+        try:
+            text = page.get_text("text", flags=PDF_TEXT_FLAGS, sort=False)
+            text = text[:max_text_chars]
+        except Exception:
+            text = ""
+        jpg = None
+        if render:
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            jpg = encode_pixels(
+                pix.samples,
+                pix.width,
+                pix.height,
+                pix.n,
+                pix.stride,
+                max_dimension=MAX_IMAGE_DIMENSION,
+                target=target,
+            )
+    return idx, text, jpg
+
+
+def ingest_pdf(
+    path: Path, vision_target: Optional[str] = None
+) -> Tuple[str, List[str], Callable]:
+    """
+    Extract text with PyMuPDF and raster the first N pages (MAX_IMAGES) as JPEGs.
+    Pages are processed in parallel in a process pool.
+    """
+    buf = io.StringIO()  # page texts, bounded by MAX_TEXT_CHARS
+    images: List[Tuple[str, bytes]] = []
 
     try:
-        doc = fitz.open(str(path))
-        for idx, page in enumerate(doc):
-            # Collect text
-            try:
-                texts.append(page.get_text("text"))
-            except Exception:
-                pass
-            # Render first N pages as PNG
-            if idx < MAX_IMAGES:
-                pix = page.get_pixmap(dpi=PDF_RASTER_DPI)
-                out = tmpdir / f"page_{idx+1}.png"
-                pix.save(str(out))
-                images.append(str(out))
-            # Early stop for very long PDFs
-            if sum(len(t) for t in texts) > MAX_TEXT_CHARS * 1.5:
-                break
+        with fitz.open(str(path)) as doc:
+            page_count = doc.page_count
+        if page_count <= 1:
+            results = [
+                _pdf_page_worker(
+                    str(path), i, PDF_RASTER_DPI, True, MAX_TEXT_CHARS, vision_target
+                )
+                for i in range(page_count)
+            ]
+        else:
+            results = _pdf_pages_parallel(str(path), page_count, vision_target)
+        for idx, text, jpg in results:
+            buf.write(text)
+            buf.write("\n")
+            if jpg is not None:
+                images.append((f"page_{idx+1}.jpg", jpg))
     except Exception:
         # Fallback: unstructured
         return ingest_via_unstructured(path)
 
-    # Resize rasterized pages
-    resized_paths, resize_cleanup = resize_images_batch(
-        images, max_dimension=MAX_IMAGE_DIMENSION
-    )
-
-    # Combined cleanup
-    def combined_cleanup():
-        try:
-            resize_cleanup()
-        except Exception:
-            pass
-        try:
-            tmpdir_obj.cleanup()
-        except Exception:
-            pass
+    # pages come back sized and encoded from the workers
+    resized_paths, resize_cleanup = write_image_blobs(images)
 
-    excerpt = _truncate("\n".join(texts))
-    return excerpt, resized_paths, combined_cleanup
+    excerpt = _truncate(buf.getvalue())
+    return excerpt, resized_paths, resize_cleanup
 
 
-def ingest_pptx(path: Path) -> Tuple[str, List[str], Callable]:
+def _pdf_pages_parallel(
+    path_str: str, page_count: int, target: Optional[str] = None
+) -> List[Tuple[int, str, Optional[bytes]]]:
+    """
+    Per-page results in page order. Rendered pages (idx < MAX_IMAGES) are
+    submitted up front; text pages follow in batches of PDF_WORKERS until
+    MAX_TEXT_CHARS of text are collected (the excerpt is cut there anyway).
+    """
+    pool = _get_pdf_pool()
+    render = {
+        i: pool.submit(
+            _pdf_page_worker, path_str, i, PDF_RASTER_DPI, True, MAX_TEXT_CHARS, target
+        )
+        for i in range(min(MAX_IMAGES, page_count))
+    }
+    results = []
+    total = 0
+    try:
+        for start in range(0, page_count, PDF_WORKERS):
+            batch = [
+                render.get(i)
+                or pool.submit(_pdf_page_worker, path_str, i, 0, False, MAX_TEXT_CHARS)
+                for i in range(start, min(start + PDF_WORKERS, page_count))
+            ]
+            for i, fut in enumerate(batch):
+                results.append(fut.result())
+                total += len(results[-1][1]) + 1
+                if total >= MAX_TEXT_CHARS:
+                    for f in batch[i + 1 :]:
+                        f.cancel()
+                    return results
+    finally:
+        for f in render.values():
+            f.cancel()
+    return results
+
+
+def ingest_pptx(
+    path: Path, vision_target: Optional[str] = None
+) -> Tuple[str, List[str], Callable]:
     """
     Extract per slide title, notes and images (if any).
     """
@@ -173,9 +293,8 @@ def ingest_pptx(path: Path) -> Tuple[str, List[str], Callable]:
         return ingest_via_unstructured(path)
 
     pieces: List[str] = []
-    images: List[str] = []
-    tmpdir_obj = tempfile.TemporaryDirectory(prefix="docsort_pptx_")
-    tmpdir = Path(tmpdir_obj.name)
+    total = 0
+    images: List[Tuple[str, bytes]] = []
 
     try:
         for i, slide in enumerate(prs.slides, start=1):
@@ -204,16 +323,10 @@ def ingest_pptx(path: Path) -> Tuple[str, List[str], Callable]:
                 for shp in slide.shapes:
                     if hasattr(shp, "image") and shp.image is not None:
                         try:
-                            # Extract image blob
-                            img_data = shp.image.blob
+                            # keep the blob in memory; written once, resized
                             img_ext = shp.image.ext
                             img_filename = f"slide_{i}_image_{len(images)+1}.{img_ext}"
-                            img_path = tmpdir / img_filename
-
-                            with open(img_path, "wb") as f:
-                                f.write(img_data)
-
-                            images.append(str(img_path))
+                            images.append((img_filename, shp.image.blob))
 
                             if len(images) >= MAX_IMAGES:
                                 break
@@ -235,56 +348,70 @@ def ingest_pptx(path: Path) -> Tuple[str, List[str], Callable]:
                 # API variance: ignore on error
                 pass
 
-            pieces.append(
+            piece = (
                 f"Slide {i}"
                 + (f" — {title}" if title else "")
                 + (f"\n{body}" if body else "")
                 + (f"\nNotes: {notes_txt}" if notes_txt else "")
             )
-            if len("\n\n".join(pieces)) > MAX_TEXT_CHARS * 1.5:
+            pieces.append(piece)
+            # running length of "\n\n".join(pieces) (no re-join per slide)
+            total += len(piece) + (2 if len(pieces) > 1 else 0)
+            if total > MAX_TEXT_CHARS * 1.5:
                 break
     except Exception:
         # On errors, return text only
         pass
 
-    # Resize extracted images
-    resized_paths, resize_cleanup = resize_images_batch(
-        images, max_dimension=MAX_IMAGE_DIMENSION
+    # Resize extracted images (straight from memory)
+    resized_paths, resize_cleanup = resize_image_blobs(
+        images, max_dimension=MAX_IMAGE_DIMENSION, target=vision_target
     )
 
-    # Combined cleanup
-    def combined_cleanup():
-        try:
-            resize_cleanup()
-        except Exception:
-            pass
-        try:
-            tmpdir_obj.cleanup()
-        except Exception:
-            pass
-
     excerpt = _truncate("\n\n---\n\n".join(pieces))
-    return excerpt, resized_paths, combined_cleanup
+    return excerpt, resized_paths, resize_cleanup
 
 
-def ingest_file(path: Path) -> Tuple[str, List[str], callable]:
-    ext = path.suffix.lower()
-    if ext in {".jpg", ".jpeg", ".png"}:
-        return ingest_image(path)
-    if ext == ".docx":
-        try:
-            return ingest_docx(path)
-        except Exception:
-            return ingest_via_unstructured(path)
-    if ext in {".doc", ".odt"}:
-        return ingest_via_unstructured(path)
-    if ext in {".pdf"}:
-        return ingest_pdf(path)
-    if ext in {".pptx"}:
-        return ingest_pptx(path)
-    if ext in {".ppt"}:
+def _docx_with_fallback(path: Path, vision_target: Optional[str] = None):
+    try:
+        return ingest_docx(path, vision_target)
+    except Exception:
         return ingest_via_unstructured(path)
-    if ext in {".txt"}:
-        return ingest_txt(path)
+
+
+def _text_only(fn: Callable) -> Callable:
+    # text-only ingesters have no images to size
+    return lambda path, vision_target=None: fn(path)
+
+
+def _unsupported(path: Path, vision_target: Optional[str] = None):
     # Unsupported file extensions → return (None, [], noop)
     return None, [], lambda: None
+
+
+# suffix -> ingester(path, vision_target)
+_DISPATCH = {
+    ".jpg": ingest_image,
+    ".jpeg": ingest_image,
+    ".png": ingest_image,
+    ".docx": _docx_with_fallback,
+    ".doc": _text_only(ingest_via_unstructured),
+    ".odt": _text_only(ingest_via_unstructured),
+    ".pdf": ingest_pdf,
+    ".pptx": ingest_pptx,
+    ".ppt": _text_only(ingest_via_unstructured),
+    ".txt": _text_only(ingest_txt),
+}
+
+
+def ingest_file(
+    path: Path, vision_target: Optional[str] = None
+) -> Tuple[str, List[str], callable]:
+    """
+    Returns (excerpt, image paths, cleanup). vision_target tunes image sizes
+    to the provider ("openai-low" / "openai-high", see image_utils).
+    """
+    ext = path.suffix.lower()
+    if ext in SUPPORTED_EXTS:
+        prefetch_file(path)
+    return _DISPATCH.get(ext, _unsupported)(path, vision_target)
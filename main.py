@@ -1,11 +1,17 @@
 # main.py
-import argparse, time
+import argparse, asyncio, os, queue, threading, time
 from pathlib import Path
 
 from taxonomy import list_leaf_paths, build_schema
-from fs_ops import load_processed_hashes, file_sha256
-from classify import classify_item
+from fs_ops import load_processed_hashes, file_hashes
+from classify import ingest_item_async, classify_ingested_async, flush_index
 from ingest import is_supported_file
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileSystemEventHandler
+
+TAXONOMY_REFRESH_S = 60.0  # watch mode: full taxonomy re-scan at least this often
+WATCH_DEBOUNCE_S = 0.2  # watch mode: quiet time before a batch of new files runs
 
 
 def run_once(
@@ -18,18 +24,35 @@ def run_once(
     model: str,
     keep_alive,
     dry_run: bool,
+    max_concurrency: int = 4,
+    workers: int = 4,
+    allowed: list[str] | None = None,
+    schema: dict | None = None,
+    seen_hashes: set[str] | None = None,
+    files: list[Path] | None = None,
 ):
-    allowed = list_leaf_paths(lib_root)
-    schema = build_schema(allowed)
-    seen_hashes = load_processed_hashes(Path("./logs/processed.jsonl"))
+    """
+    Classify everything in the inbox once (or only files, if given).
+    allowed/schema/seen_hashes can be passed in by long-running callers
+    (watch_mode); seen_hashes is updated in place with the hashes of newly
+    processed files.
+    """
+    if allowed is None:
+        allowed = list_leaf_paths(lib_root)
+    if schema is None:
+        schema = build_schema(allowed)
+    if seen_hashes is None:
+        seen_hashes = load_processed_hashes(Path("./logs/processed.jsonl"))
     unsorted_dir = lib_root / "Unsorted_Review"
 
     processed = 0
-    for p in sorted(inbox.iterdir()):
-        if not p.is_file():
-            continue
-
-        h = file_sha256(p)
+    todo: list[Path] = []
+    todo_hashes: list[str] = []
+    if files is None:
+        files = [p for p in sorted(inbox.iterdir()) if p.is_file()]
+    # hash in parallel (hashlib releases the GIL); results arrive in order
+    hashes = file_hashes(files, workers=max(1, workers))
+    for p, h in zip(files, hashes):
         if not dry_run and h in seen_hashes and action == "copy":
             print(f"[skip] {p.name} (bereits verarbeitet)")
             continue
@@ -55,27 +78,104 @@ def run_once(
                     print(f"[ERROR] {p.name} (Unsorted): {ex}")
             continue
 
-        try:
-            dst = classify_item(
-                p,
-                lib_root,
-                allowed,
-                schema,
-                provider=provider,
-                min_confidence=min_conf,
-                action=action,
-                model=model,
-                keep_alive=keep_alive,
-                dry_run=dry_run,
-            )
-            processed += 1
-            tag = "dry-run" if dry_run else "ok"
-            print(f"[{tag}] {p.name} -> {dst}")
-        except Exception as ex:
-            print(f"[ERROR] {p.name}: {ex}")
+        todo.append(p)
+        todo_hashes.append(h)
+
+    results = asyncio.run(
+        _classify_all(
+            todo,
+            todo_hashes,
+            lib_root,
+            allowed,
+            schema,
+            max_concurrency=max_concurrency,
+            ingest_workers=workers,
+            provider=provider,
+            min_confidence=min_conf,
+            action=action,
+            model=model,
+            keep_alive=keep_alive,
+            dry_run=dry_run,
+        )
+    )
+    for p, h, res in zip(todo, todo_hashes, results):
+        if isinstance(res, Exception):
+            print(f"[ERROR] {p.name}: {res}")
+            continue
+        processed += 1
+        if not dry_run and h:
+            seen_hashes.add(h)  # same as what append_log just recorded
+        tag = "dry-run" if dry_run else "ok"
+        print(f"[{tag}] {p.name} -> {res}")
+    flush_index()
     return processed
 
 
+async def _classify_all(
+    files: list[Path],
+    hashes: list[str],
+    lib_root: Path,
+    allowed: list[str],
+    schema: dict,
+    *,
+    max_concurrency: int,
+    ingest_workers: int,
+    **kwargs,
+) -> list:
+    """
+    Two-stage pipeline: ingest_workers tasks ingest files (disk/CPU, in
+    threads) while max_concurrency tasks run model calls (network). They are
+    joined by a bounded queue, so ingest stays at most a few files ahead of
+    the model (backpressure) instead of holding every excerpt/image at once.
+    Results are returned in file order (exceptions as values).
+    """
+    results: list = [None] * len(files)
+    if not files:
+        return results
+    n_llm = max(1, min(max_concurrency, len(files)))
+    n_ingest = max(1, min(ingest_workers, len(files)))
+    todo = iter(enumerate(zip(files, hashes)))
+    llm_q: asyncio.Queue = asyncio.Queue(maxsize=2 * n_llm)
+    provider = kwargs.get("provider", "ollama")
+    t0 = time.perf_counter()
+    done = 0
+
+    def progress():
+        nonlocal done
+        done += 1
+        elapsed = time.perf_counter() - t0
+        eta = elapsed / done * (len(files) - done)
+        print(f"[progress] {done}/{len(files)} ({elapsed:.0f}s, ETA {eta:.0f}s)")
+
+    async def ingest_stage():
+        for i, (p, h) in todo:  # shared iterator: each file is taken once
+            try:
+                ingested = await ingest_item_async(p, provider=provider, doc_id=h)
+            except Exception as e:
+                results[i] = e
+                progress()
+                continue
+            await llm_q.put((i, p, ingested))
+
+    async def llm_stage():
+        while (item := await llm_q.get()) is not None:
+            i, p, ingested = item
+            try:
+                results[i] = await classify_ingested_async(
+                    p, ingested, lib_root, allowed, schema, **kwargs
+                )
+            except Exception as e:
+                results[i] = e
+            progress()
+
+    consumers = [asyncio.create_task(llm_stage()) for _ in range(n_llm)]
+    await asyncio.gather(*(ingest_stage() for _ in range(n_ingest)))
+    for _ in consumers:
+        await llm_q.put(None)
+    await asyncio.gather(*consumers)
+    return results
+
+
 def parse_args():
     ap = argparse.ArgumentParser(
         description="Sort documents (image/Word/ODT) via Ollama or OpenAI (Structured Outputs)."
@@ -102,11 +202,43 @@ def parse_args():
         default="2h",
         help='Ollama only (e.g., "10m", "2h", "-1")',
     )
+    ap.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        help="Parallel classifications (Ollama: match OLLAMA_NUM_PARALLEL on the server)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Threads for hashing the inbox and for ingesting files (text/images)",
+    )
     ap.add_argument("--dry-run", action="store_true")
     ap.add_argument("--watch", action="store_true")
+    ap.add_argument(
+        "--polling",
+        action="store_true",
+        help="Watch mode: use PollingObserver (e.g., for network drives)",
+    )
     return ap.parse_args()
 
 
+class _InboxHandler(FileSystemEventHandler):
+    """Queue files that appear in the inbox (created or moved in)."""
+
+    def __init__(self, q: "queue.Queue[Path]"):
+        self.q = q
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.q.put(Path(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.q.put(Path(event.dest_path))
+
+
 def watch_mode(
     inbox: Path,
     lib_root: Path,
@@ -117,34 +249,90 @@ def watch_mode(
     model: str,
     keep_alive,
     dry_run: bool,
+    max_concurrency: int = 4,
+    workers: int = 4,
     interval: float = 3.0,
+    polling: bool = False,
 ):
-    print(f"[watch] Watching {inbox} (interval {interval}s) …  Stop: Ctrl+C")
-    seen = set()
-    while True:
-        try:
-            for p in inbox.iterdir():
-                if p.is_file() and p not in seen:
-                    time.sleep(0.2)
-                    if not p.exists():
-                        continue
-                    run_once(
-                        inbox,
-                        lib_root,
-                        provider=provider,
-                        min_conf=min_conf,
-                        action=action,
-                        model=model,
-                        keep_alive=keep_alive,
-                        dry_run=dry_run,
-                    )
-                    seen.add(p)
-        except KeyboardInterrupt:
-            print("\n[watch] stopped.")
-            return
-        except Exception as e:
-            print(f"[watch][warn] {e}")
-        time.sleep(interval)
+    """
+    Classify the current inbox, then react to filesystem events: new files
+    are queued and classified by one consumer thread in batches (whatever
+    arrived within WATCH_DEBOUNCE_S), each batch via run_once(files=...).
+    interval is the scan interval of the PollingObserver (polling=True).
+    """
+    seen_hashes = load_processed_hashes(Path("./logs/processed.jsonl"))
+    taxonomy = {"allowed": [], "schema": {}, "mtime": None, "ts": 0.0}
+    kwargs = dict(
+        provider=provider,
+        min_conf=min_conf,
+        action=action,
+        model=model,
+        keep_alive=keep_alive,
+        dry_run=dry_run,
+        max_concurrency=max_concurrency,
+        workers=workers,
+        seen_hashes=seen_hashes,
+    )
+
+    def run(files: list[Path] | None):
+        # taxonomy: recompute when lib_root changes, and periodically for
+        # nested folders (their mtime does not propagate to lib_root)
+        mtime = os.stat(lib_root).st_mtime_ns
+        now = time.monotonic()
+        if mtime != taxonomy["mtime"] or now - taxonomy["ts"] > TAXONOMY_REFRESH_S:
+            taxonomy["allowed"] = list_leaf_paths(lib_root)
+            taxonomy["schema"] = build_schema(taxonomy["allowed"])
+            taxonomy["mtime"], taxonomy["ts"] = mtime, now
+        run_once(
+            inbox,
+            lib_root,
+            allowed=taxonomy["allowed"],
+            schema=taxonomy["schema"],
+            files=files,
+            **kwargs,
+        )
+
+    q: "queue.Queue[Path]" = queue.Queue()
+    inbox_dir = inbox.resolve()
+
+    def consume():
+        while True:
+            batch = {q.get()}
+            # debounce: let copies finish and collect files dropped together
+            while True:
+                try:
+                    batch.add(q.get(timeout=WATCH_DEBOUNCE_S))
+                except queue.Empty:
+                    break
+            files = sorted(
+                p for p in batch if p.parent.resolve() == inbox_dir and p.is_file()
+            )
+            if not files:
+                continue
+            try:
+                run(files)
+            except Exception as e:
+                print(f"[watch][warn] {e}")
+
+    observer = PollingObserver(timeout=interval) if polling else Observer()
+    observer.schedule(_InboxHandler(q), str(inbox), recursive=False)
+    observer.start()
+    print(
+        f"[watch] Watching {inbox} ({'polling' if polling else 'native'}) …  Stop: Ctrl+C"
+    )
+    try:
+        run(None)  # files already in the inbox
+    except Exception as e:
+        print(f"[watch][warn] {e}")
+    threading.Thread(target=consume, daemon=True).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n[watch] stopped.")
+    finally:
+        observer.stop()
+        observer.join()
 
 
 if __name__ == "__main__":
@@ -159,6 +347,9 @@ if __name__ == "__main__":
             model=args.model,
             keep_alive=args.keep_alive,
             dry_run=args.dry_run,
+            max_concurrency=args.max_concurrency,
+            workers=args.workers,
+            polling=args.polling,
         )
     else:
         n = run_once(
@@ -170,6 +361,8 @@ if __name__ == "__main__":
             model=args.model,
             keep_alive=args.keep_alive,
             dry_run=args.dry_run,
+            max_concurrency=args.max_concurrency,
+            workers=args.workers,
         )
         tag = "dry-run" if args.dry_run else "done"
         print(f"[{tag}] verarbeitet: {n}")
@@ -1,33 +1,48 @@
 # ollama_client.py
+from pathlib import Path
 from typing import Any, Tuple
+import asyncio, weakref
 import ollama
 
+from fs_ops import image_bytes
+
 
 class OllamaError(RuntimeError):
     pass
 
 
-def chat_structured(
-    model: str,
+# AsyncClient holds loop-bound connections: one client per event loop
+_ASYNC_CLIENTS: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ollama.AsyncClient]"
+) = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> ollama.AsyncClient:
+    """Shared per loop: concurrent calls reuse keep-alive connections."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = ollama.AsyncClient()
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+def _build_request(
     system: str,
     user_content: str,
     image_paths: list[str] | None,
     format_schema: dict | str | None,
-    *,
-    temperature: float = 0.0,
-    keep_alive: str | int | None = "2h",
-    extra_options: dict | None = None,
-) -> Tuple[str, dict]:
-    """
-    Call via official ollama Python library (non-RAW).
-    Returns (content, meta) with metrics where available.
-    """
+    temperature: float,
+    keep_alive: str | int | None,
+    extra_options: dict | None,
+) -> Tuple[list[dict[str, Any]], dict[str, Any]]:
     messages: list[dict[str, Any]] = [
         {"role": "system", "content": system},
         {"role": "user", "content": user_content},
     ]
     if image_paths:
-        messages[-1]["images"] = image_paths
+        # raw bytes: the client encodes them once for the request body
+        messages[-1]["images"] = [image_bytes(Path(p)) for p in image_paths]
 
     options = {"temperature": temperature}
     if extra_options:
@@ -38,11 +53,10 @@ def chat_structured(
         kwargs["format"] = format_schema
     if keep_alive is not None:
         kwargs["keep_alive"] = keep_alive  # hält nur das Modell warm, keine History
+    return messages, kwargs
 
-    try:
-        resp = ollama.chat(model=model, messages=messages, **kwargs)
-    except Exception as e:
-        raise OllamaError(f"Ollama chat() fehlgeschlagen: {e}") from e
+
+def _parse_response(resp) -> Tuple[str, dict]:
     # Extract content
     content = ""
     if isinstance(resp, dict):
@@ -70,3 +84,67 @@ def chat_structured(
         for k in keys
     }
     return content, meta
+
+
+def chat_structured(
+    model: str,
+    system: str,
+    user_content: str,
+    image_paths: list[str] | None,
+    format_schema: dict | str | None,
+    *,
+    temperature: float = 0.0,
+    keep_alive: str | int | None = "2h",
+    extra_options: dict | None = None,
+) -> Tuple[str, dict]:
+    """
+    Call via official ollama Python library (non-RAW).
+    Returns (content, meta) with metrics where available.
+    """
+    messages, kwargs = _build_request(
+        system,
+        user_content,
+        image_paths,
+        format_schema,
+        temperature,
+        keep_alive,
+        extra_options,
+    )
+    try:
+        resp = ollama.chat(model=model, messages=messages, **kwargs)
+    except Exception as e:
+        raise OllamaError(f"Ollama chat() fehlgeschlagen: {e}") from e
+    return _parse_response(resp)
+
+
+async def chat_structured_async(
+    model: str,
+    system: str,
+    user_content: str,
+    image_paths: list[str] | None,
+    format_schema: dict | str | None,
+    *,
+    temperature: float = 0.0,
+    keep_alive: str | int | None = "2h",
+    extra_options: dict | None = None,
+) -> Tuple[str, dict]:
+    """
+    Async variant of chat_structured (ollama.AsyncClient).
+    Concurrent requests are only served in parallel if the server allows it:
+    OLLAMA_NUM_PARALLEL (requests per model) and OLLAMA_MAX_LOADED_MODELS.
+    """
+    messages, kwargs = _build_request(
+        system,
+        user_content,
+        image_paths,
+        format_schema,
+        temperature,
+        keep_alive,
+        extra_options,
+    )
+    try:
+        client = _get_async_client()
+        resp = await client.chat(model=model, messages=messages, **kwargs)
+    except Exception as e:
+        raise OllamaError(f"Ollama chat() fehlgeschlagen: {e}") from e
+    return _parse_response(resp)
@@ -1,10 +1,14 @@
 # openai_client.py
 from __future__ import annotations
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple, Type
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import base64, mimetypes, os, time
+from pathlib import Path
+import asyncio, base64, hashlib, mimetypes, os, threading, time, weakref
+
+from fs_ops import image_bytes
 
 load_dotenv()  # load OPENAI_API_KEY from .env
 
@@ -13,25 +17,166 @@ class OpenAIError(RuntimeError):
     pass
 
 
-def _to_data_url(path: str) -> str:
+_CLIENT: Optional[OpenAI] = None
+_CLIENT_LOCK = threading.Lock()
+# AsyncOpenAI holds loop-bound connections: one client per event loop
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_client() -> OpenAI:
+    """Shared client: keeps the HTTP connection pool (TCP/TLS) across calls."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _CLIENT
+
+
+def _get_async_client() -> AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+# Uploads expire on OpenAI's side (default: kept until deleted), so nothing
+# piles up in the account's file storage
+FILE_TTL_S = 3600  # minimum the Files API accepts
+FILE_REUSE_S = FILE_TTL_S - 600  # cached file_ids are reused only this long
+# sha256(image bytes) -> (file_id, upload time) of a purpose="vision" upload, LRU
+_FILE_IDS: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_FILE_IDS_MAX = 1024
+_FILE_IDS_LOCK = threading.Lock()
+
+
+def _mime_for(path: str) -> str:
     mime, _ = mimetypes.guess_type(path)
     if not mime:
         ext = os.path.splitext(path)[1].lower()
         mime = "image/png" if ext == ".png" else "image/jpeg"
-    b64 = base64.b64encode(open(path, "rb").read()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+    return mime
 
 
-def _build_user_content(
-    user_text: str, image_paths: Optional[List[str]]
-) -> List[Dict[str, Any]]:
-    parts: List[Dict[str, Any]] = [{"type": "input_text", "text": user_text}]
+def _to_data_url(path: str) -> str:
+    b64 = base64.b64encode(image_bytes(Path(path))).decode("ascii")
+    return f"data:{_mime_for(path)};base64,{b64}"
+
+
+def _upload_args(path: str) -> Tuple[str, Dict[str, Any]]:
+    data = image_bytes(Path(path))
+    key = hashlib.sha256(data).hexdigest()
+    return key, {
+        "file": (os.path.basename(path), data, _mime_for(path)),
+        "purpose": "vision",
+        "expires_after": {"anchor": "created_at", "seconds": FILE_TTL_S},
+    }
+
+
+def _cached_file_id(key: str) -> Optional[str]:
+    """file_id of an earlier upload of the same image, unless about to expire."""
+    with _FILE_IDS_LOCK:
+        entry = _FILE_IDS.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > FILE_REUSE_S:
+            del _FILE_IDS[key]
+            return None
+        _FILE_IDS.move_to_end(key)
+        return entry[0]
+
+
+def _remember_file_id(key: str, file_id: str) -> None:
+    with _FILE_IDS_LOCK:
+        _FILE_IDS[key] = (file_id, time.monotonic())
+        _FILE_IDS.move_to_end(key)
+        while len(_FILE_IDS) > _FILE_IDS_MAX:
+            _FILE_IDS.popitem(last=False)  # least recently used
+
+
+def _image_part(path: str, file_id: Optional[str]) -> Dict[str, Any]:
+    if file_id:
+        return {"type": "input_image", "file_id": file_id}
+    # Base64 data URL in input (per OpenAI docs)
+    return {"type": "input_image", "image_url": _to_data_url(path)}
+
+
+def _image_parts(client: OpenAI, image_paths: Optional[List[str]]) -> List[dict]:
+    """
+    Upload images once (Files API, deduplicated by content hash, expiring after
+    FILE_TTL_S) and reference them by file_id; falls back to a data URL if the
+    upload fails.
+    """
+    parts = []
     for p in image_paths or []:
-        # Base64 data URL in input (per OpenAI docs)
-        parts.append({"type": "input_image", "image_url": _to_data_url(p)})
+        file_id = None
+        try:
+            key, args = _upload_args(p)
+            file_id = _cached_file_id(key)
+            if file_id is None:
+                file_id = client.files.create(**args).id
+                _remember_file_id(key, file_id)
+        except Exception:
+            file_id = None
+        parts.append(_image_part(p, file_id))
     return parts
 
 
+async def _image_parts_async(
+    client: AsyncOpenAI, image_paths: Optional[List[str]]
+) -> List[dict]:
+    """Async variant of _image_parts."""
+    parts = []
+    for p in image_paths or []:
+        file_id = None
+        try:
+            key, args = _upload_args(p)
+            file_id = _cached_file_id(key)
+            if file_id is None:
+                file_id = (await client.files.create(**args)).id
+                _remember_file_id(key, file_id)
+        except Exception:
+            file_id = None
+        parts.append(_image_part(p, file_id))
+    return parts
+
+
+def _build_input(
+    system_prompt: str, user_text: str, image_parts: List[dict]
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
+        {
+            "role": "user",
+            "content": [{"type": "input_text", "text": user_text}, *image_parts],
+        },
+    ]
+
+
+def _parse_response(resp, wall_ms: float) -> Tuple[BaseModel, Dict[str, Any]]:
+    parsed = getattr(resp, "output_parsed", None)
+    if parsed is None:
+        raise OpenAIError("output_parsed fehlt / konnte nicht geparst werden")
+
+    # Token/usage data (if available)
+    d = getattr(resp, "to_dict", lambda: {})()
+    usage = d.get("usage", {}) if isinstance(d, dict) else {}
+    meta = {
+        "model": getattr(resp, "model", None) or d.get("model"),
+        "latency_ms": round(wall_ms, 2),
+        "usage_input_tokens": usage.get("input_tokens"),
+        "usage_output_tokens": usage.get("output_tokens"),
+        "usage_total_tokens": usage.get("total_tokens"),
+    }
+    return parsed, meta
+
+
 def responses_parse_structured(
     *,
     model: str,
@@ -46,38 +191,41 @@ def responses_parse_structured(
     Returns (parsed_object, meta).
     """
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout_s)
+        # with_options: per-call timeout on the shared connection pool
+        client = _get_client().with_options(timeout=timeout_s)
+        image_parts = _image_parts(client, image_paths)
         t0 = time.perf_counter()
         resp = client.responses.parse(
             model=model,
-            input=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": _build_user_content(user_text, image_paths),
-                },
-            ],
+            input=_build_input(system_prompt, user_text, image_parts),
             text_format=pyd_model,
         )
         wall_ms = (time.perf_counter() - t0) * 1000.0
     except Exception as e:
         raise OpenAIError(f"OpenAI responses.parse() fehlgeschlagen: {e}") from e
+    return _parse_response(resp, wall_ms)
 
-    parsed = getattr(resp, "output_parsed", None)
-    if parsed is None:
-        raise OpenAIError("output_parsed fehlt / konnte nicht geparst werden")
 
-    # Token/usage data (if available)
-    d = getattr(resp, "to_dict", lambda: {})()
-    usage = d.get("usage", {}) if isinstance(d, dict) else {}
-    meta = {
-        "model": getattr(resp, "model", None) or d.get("model"),
-        "latency_ms": round(wall_ms, 2),
-        "usage_input_tokens": usage.get("input_tokens"),
-        "usage_output_tokens": usage.get("output_tokens"),
-        "usage_total_tokens": usage.get("total_tokens"),
-    }
-    return parsed, meta
+async def responses_parse_structured_async(
+    *,
+    model: str,
+    system_prompt: str,
+    user_text: str,
+    image_paths: Optional[List[str]],
+    pyd_model: Type[BaseModel],
+    timeout_s: int = 300,
+) -> Tuple[BaseModel, Dict[str, Any]]:
+    """Async variant of responses_parse_structured (AsyncOpenAI)."""
+    try:
+        client = _get_async_client().with_options(timeout=timeout_s)
+        image_parts = await _image_parts_async(client, image_paths)
+        t0 = time.perf_counter()
+        resp = await client.responses.parse(
+            model=model,
+            input=_build_input(system_prompt, user_text, image_parts),
+            text_format=pyd_model,
+        )
+        wall_ms = (time.perf_counter() - t0) * 1000.0
+    except Exception as e:
+        raise OpenAIError(f"OpenAI responses.parse() fehlgeschlagen: {e}") from e
+    return _parse_response(resp, wall_ms)
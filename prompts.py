@@ -1,3 +1,8 @@
+import functools
+
+# Bump whenever SYSTEM_PROMPT/build_user_prompt change (part of the LLM cache key)
+SYSTEM_PROMPT_VERSION = 2
+
 SYSTEM_PROMPT = """Du bist ein Ablage-Assistent zur automatischen Zuordnung von Dokumenten in ein vorgegebenes Ordnersystem.
 Du erhältst entweder ein einzelnes Bild (z.B. eingescanntes Arbeitsblatt) oder den Inhalt eines Textdokuments/Präsentation (z.B. Word/ODT/PDF/PPTX). Deine Aufgabe besteht darin, das Dokument anhand seines Inhalts optimal in einen der erlaubten Ordner einzuordnen.
 Außerdem sollst du 3-8 prägnante Tags erzeugen (einzelne Wörter oder kurze Phrasen, deutsch). Falls das Eingabeobjekt ein Bild ist (oder eine gerenderte PDF-Seite), gib zusätzlich eine knappe Caption (ein Satz).
@@ -17,11 +22,22 @@ Wenn das Dokument keiner Kategorie klar zugeordnet werden kann oder unvollständ
 def build_user_prompt(
     filename: str, allowed_paths: list[str], excerpt: str | None = None
 ) -> str:
+    # Static part first, per-file part last: identical prefix across calls
+    # lets providers reuse their prompt cache (OpenAI prompt caching).
     base = [
+        _static_prompt_prefix(tuple(allowed_paths)),
         f"Dateiname: {filename}",
-        f"Zulässige Zielordner (relativ): {allowed_paths}",
-        "Aufgabe: Bestimme den am besten passenden Zielordner, erzeuge Tags und ggf. eine Bild-Caption. Liefere nur JSON, ohne zusätzlichen Text.",
     ]
     if excerpt:
-        base.insert(1, f"Dokumentauszug (gekürzt):\n{excerpt}")
+        base.append(f"Dokumentauszug (gekürzt):\n{excerpt}")
     return "\n".join(base)
+
+
+@functools.lru_cache(maxsize=8)
+def _static_prompt_prefix(allowed_paths: tuple[str, ...]) -> str:
+    return "\n".join(
+        [
+            f"Zulässige Zielordner (relativ): {list(allowed_paths)}",
+            "Aufgabe: Bestimme den am besten passenden Zielordner, erzeuge Tags und ggf. eine Bild-Caption. Liefere nur JSON, ohne zusätzlichen Text.",
+        ]
+    )
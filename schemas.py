@@ -1,6 +1,7 @@
 # schemas.py
-from typing import List, Type, Optional
+from typing import List, Type, Optional, Tuple
 from pydantic import BaseModel, field_validator, ConfigDict
+import functools
 
 
 def build_docsort_model(allowed_paths: List[str]) -> Type[BaseModel]:
@@ -10,9 +11,16 @@ def build_docsort_model(allowed_paths: List[str]) -> Type[BaseModel]:
       - confidence in [0, 1]
       - reason: str
       - alternatives: List[str] (optional)
+    Das Modell wird pro Pfadmenge nur einmal gebaut (Cache).
     """
     if not allowed_paths:
         raise ValueError("allowed_paths darf nicht leer sein")
+    return _build_docsort_model_cached(tuple(sorted(allowed_paths)))
+
+
+@functools.lru_cache(maxsize=8)
+def _build_docsort_model_cached(paths: Tuple[str, ...]) -> Type[BaseModel]:
+    allowed_paths = frozenset(paths)
 
     class DocSortResult(BaseModel):
         model_config = ConfigDict(extra="forbid")
@@ -1,5 +1,5 @@
 # search_normalize.py
-import re
+import itertools, re
 
 DE_MAP = {
     "ä": ["a", "ae"],
@@ -13,37 +13,73 @@ DE_MAP = {
 REV_MAP = {"ae": ["ä", "a"], "oe": ["ö", "o"], "ue": ["ü", "u"], "ss": ["ß", "s"]}
 
 
+# one pass finds every replaceable position (umlaut/ß or digraph, any case)
+_DE_RE = re.compile(r"(?i:ae|oe|ue|ss)|[äöüÄÖÜß]")
+# every digraph start, overlapping ones included ("sss": 0 and 1)
+_DIGRAPH_AT_RE = re.compile(r"(?=(?i:ae|oe|ue|ss))")
+_TOKEN_RE = re.compile(r"[A-Za-zÀ-ÿ0-9_+-]+")
+DE_MAX_VARIANTS = 64  # above this, positions are varied one at a time
+
+
+def _de_options(m: str) -> list[str]:
+    """Alternatives for one match, the original spelling first."""
+    if m in DE_MAP:
+        return [m, *DE_MAP[m]]
+    reps = REV_MAP[m.lower()]
+    if m[0].isupper():
+        # "ß" stays as is: "ß".upper() / .capitalize() is "SS" / "Ss"
+        reps = [r if r == "ß" else r.upper() for r in reps]
+    return [m, *reps]
+
+
 def de_variants(token: str) -> set[str]:
-    vars = {token}
-    # 1) Umlauts → {base, digraph}
-    for i, ch in enumerate(token):
-        if ch in DE_MAP:
-            new = set()
-            for v in vars:
-                for rep in DE_MAP[ch]:
-                    new.add(v[:i] + rep + v[i + 1 :])
-            vars |= new
-    # 2) Digraphs → {with umlaut, base}
-    for s, reps in REV_MAP.items():
-        if s in token.lower():
-            new = set()
-            for v in list(vars):
-                idx = 0
-                low = v.lower()
-                while True:
-                    j = low.find(s, idx)
-                    if j < 0:
-                        break
-                    for rep in reps:
-                        new.add(v[:j] + rep + v[j + len(s) :])
-                    idx = j + 1
-            vars |= new
-    return {v for v in vars}
+    out = _de_product(token)
+    # digraphs overlapping a scanned match (e.g. the second "ss" in
+    # "Schlosssee"): replaced there, the rest varied as usual
+    starts = {m.start() for m in _DE_RE.finditer(token)}
+    for m in _DIGRAPH_AT_RE.finditer(token):
+        j = m.start()
+        if j in starts or j - 1 not in starts:
+            continue
+        for alt in _de_options(token[j : j + 2])[1:]:
+            # shorter than token: the recursion ends
+            out |= de_variants(token[:j] + alt + token[j + 2 :])
+    return out
+
+
+def _de_product(token: str) -> set[str]:
+    # split into fixed text and option lists, then build each variant once
+    segments: list[list[str]] = []
+    pos = 0
+    for m in _DE_RE.finditer(token):
+        if m.start() > pos:
+            segments.append([token[pos : m.start()]])
+        segments.append(_de_options(m.group()))
+        pos = m.end()
+    if pos < len(token):
+        segments.append([token[pos:]])
+    choices = [i for i, seg in enumerate(segments) if len(seg) > 1]
+    if not choices:
+        return {token}
+
+    n = 1
+    for i in choices:
+        n *= len(segments[i])
+    if n <= DE_MAX_VARIANTS:
+        return {"".join(combo) for combo in itertools.product(*segments)}
+
+    # many umlauts/digraphs: original plus every single-position variant
+    base = [seg[0] for seg in segments]
+    out = {token}
+    for i in choices:
+        for alt in segments[i][1:]:
+            out.add("".join(base[:i] + [alt] + base[i + 1 :]))
+    return out
 
 
 def expand_fts_query(q: str, for_prefix=True) -> str:
     # Liberal token split
-    toks = re.findall(r"[A-Za-zÀ-ÿ0-9_+-]+", q)
+    toks = _TOKEN_RE.findall(q)
     if not toks:
         return q
     parts = []
@@ -1,35 +1,117 @@
+import functools, json, os
 from pathlib import Path
 
 REVIEW_FOLDER = "Unsorted_Review"
 
 
+TAXONOMY_CACHE = Path("./logs/taxonomy_cache.json")
+
+
 def list_leaf_paths(lib_root: Path) -> list[str]:
     lib_root = lib_root.resolve()
-    allowed = []
-    for p in lib_root.rglob("*"):
-        if p.is_dir():
-            # Leaf = has no subdirectories
-            try:
-                if not any(child.is_dir() for child in p.iterdir()):
-                    rel = str(p.relative_to(lib_root)).replace("\\", "/")
-                    # skip hidden/empty path parts
-                    if rel and not any(part.startswith(".") for part in rel.split("/")):
-                        allowed.append(rel)
-            except PermissionError:
-                continue
-    # ensure review folder exists and is allowed
+    # ensure review folder exists (before the walk, so the cached
+    # fingerprint already includes it)
     review = lib_root / REVIEW_FOLDER
     review.mkdir(parents=True, exist_ok=True)
+    allowed = _cached_allowed(lib_root)
     if REVIEW_FOLDER not in allowed:
         allowed.append(REVIEW_FOLDER)
     return sorted(set(allowed))
 
 
+def _cached_allowed(lib_root: Path) -> list[str]:
+    """
+    Leaf paths from logs/taxonomy_cache.json if the library is unchanged,
+    else walk and store. Freshness = one stat per known directory instead of
+    a scandir per directory: inner dirs must keep their mtime; leaves must
+    keep their link count (2 + subdirs on most filesystems; files moved into
+    leaves do not change it), or their mtime where nlink is not meaningful.
+    """
+    root = str(lib_root)
+    try:
+        cache = json.loads(TAXONOMY_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.get(root)
+    if entry and _fresh(root, entry["dirs"]):
+        return list(entry["allowed"])
+
+    allowed, dirs = _walk(root)
+    cache[root] = {"allowed": allowed, "dirs": dirs}
+    try:
+        TAXONOMY_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TAXONOMY_CACHE.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, TAXONOMY_CACHE)
+    except OSError as e:
+        print(f"[taxonomy][warn] cache not written: {e}")
+    return list(allowed)
+
+
+def _fresh(root: str, dirs: dict) -> bool:
+    for rel, (mtime_ns, nlink, is_leaf) in dirs.items():
+        try:
+            st = os.stat(os.path.join(root, rel))
+        except OSError:
+            return False
+        if is_leaf and nlink >= 2:
+            if st.st_nlink != nlink:
+                return False
+        elif st.st_mtime_ns != mtime_ns:
+            return False
+    return True
+
+
+def _walk(root: str) -> tuple[list[str], dict]:
+    """
+    -> (leaf paths, {relpath: [mtime_ns, nlink, is_leaf]} of every visited dir)
+    """
+    allowed = []
+    dirs = {}
+    # iterative DFS over os.scandir: DirEntry caches the file type, so no
+    # extra stat per entry. Items: (dir path, descend into children?)
+    stack = [(root, True)]
+    while stack:
+        d, descend = stack.pop()
+        subdirs = []
+        try:
+            st = os.stat(d)
+            with os.scandir(d) as it:
+                for e in it:
+                    try:
+                        if e.is_dir():
+                            subdirs.append(e)
+                    except OSError:
+                        continue
+        except PermissionError:
+            continue
+        rel = os.path.relpath(d, root).replace("\\", "/")
+        dirs[rel] = [st.st_mtime_ns, st.st_nlink, not subdirs]
+        if not subdirs:
+            # Leaf = has no subdirectories
+            # skip hidden/empty path parts (root itself is never a leaf)
+            if d != root and not any(part.startswith(".") for part in rel.split("/")):
+                allowed.append(rel)
+        elif descend:
+            for e in subdirs:
+                if not e.name.startswith("."):
+                    # symlinked dirs can be leaves but are not walked into
+                    stack.append((e.path, not e.is_symlink()))
+    return allowed, dirs
+
+
 def build_schema(allowed_leaf_paths: list[str]) -> dict:
+    # cached per path list: the same dict object is returned (do not mutate),
+    # which also lets classify reuse its compiled validator
+    return _build_schema_cached(tuple(allowed_leaf_paths))
+
+
+@functools.lru_cache(maxsize=16)
+def _build_schema_cached(allowed_leaf_paths: tuple[str, ...]) -> dict:
     return {
         "type": "object",
         "properties": {
-            "target_path": {"type": "string", "enum": allowed_leaf_paths},
+            "target_path": {"type": "string", "enum": list(allowed_leaf_paths)},
             "confidence": {"type": "number", "minimum": 0, "maximum": 1},
             "reason": {"type": "string"},
             "tags": {
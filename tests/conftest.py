@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os, sys, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# index_store creates ./search at import: keep it out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="filedictator-tests-"))
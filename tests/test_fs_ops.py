@@ -0,0 +1,57 @@
+# tests/test_fs_ops.py
+import json
+
+from fs_ops import append_log, load_processed_hashes
+
+H1, H2, H3 = "a" * 64, "b" * 64, "blake3:" + "c" * 64
+
+
+def _raw_append(log, h):
+    # a writer that bypasses append_log (or an edit by hand)
+    with log.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"hash": h}) + "\n")
+
+
+def test_log_without_sidecars_leaves_no_stamp(tmp_path):
+    log = tmp_path / "dryrun.jsonl"
+    append_log(log, {"hash": H1, "dry_run": True})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dryrun.jsonl"]
+
+
+def test_sidecars_follow_append_log(tmp_path):
+    log = tmp_path / "processed.jsonl"
+    append_log(log, {"hash": H1})
+    assert load_processed_hashes(log) == {H1}  # builds the sidecars
+    append_log(log, {"hash": H2})
+    append_log(log, {"hash": H3})
+    assert (tmp_path / "processed.hashes").stat().st_size == 64
+    assert load_processed_hashes(log) == {H1, H2, H3}
+
+
+def test_lines_written_behind_the_sidecars_back_trigger_a_rebuild(tmp_path):
+    log = tmp_path / "processed.jsonl"
+    append_log(log, {"hash": H1})
+    load_processed_hashes(log)
+    _raw_append(log, H2)
+    # out of sync: this append must not extend the sidecar / refresh the stamp
+    append_log(log, {"hash": H3})
+    assert load_processed_hashes(log) == {H1, H2, H3}
+
+
+def test_truncated_log_drops_hashes(tmp_path):
+    log = tmp_path / "processed.jsonl"
+    append_log(log, {"hash": H1})
+    load_processed_hashes(log)
+    append_log(log, {"hash": H2})
+    log.write_text(log.read_text().splitlines()[0] + "\n")
+    assert load_processed_hashes(log) == {H1}
+
+
+def test_deleted_log_resets(tmp_path):
+    log = tmp_path / "processed.jsonl"
+    append_log(log, {"hash": H1})
+    load_processed_hashes(log)
+    log.unlink()
+    assert load_processed_hashes(log) == set()
+    assert not (tmp_path / "processed.hashes").exists()
+    assert not (tmp_path / "processed.hashes.stamp").exists()
@@ -0,0 +1,37 @@
+# tests/test_image_utils.py
+import pytest
+
+from image_utils import OPENAI_TILE, OPENAI_TILE_SLIVER, vision_max_dimension
+
+
+def _sliver(side: float) -> bool:
+    tiles = side / OPENAI_TILE
+    return int(tiles) >= 1 and 0 < tiles - int(tiles) <= OPENAI_TILE_SLIVER
+
+
+def test_square_just_above_one_tile_shrinks_to_one_tile():
+    assert vision_max_dimension(600, 600, 1024, "openai-high") == 512
+
+
+def test_1024x614_drops_the_height_sliver():
+    longest = vision_max_dimension(1024, 614, 1024, "openai-high")
+    assert longest == 853
+    assert not _sliver(longest) and not _sliver(614 * longest / 1024)
+
+
+@pytest.mark.parametrize("size", [(600, 600), (1024, 614), (614, 1024)])
+def test_no_side_ends_in_a_sliver(size):
+    w, h = size
+    longest = vision_max_dimension(w, h, 1024, "openai-high")
+    scale = longest / max(w, h)
+    assert not _sliver(w * scale) and not _sliver(h * scale)
+
+
+def test_images_the_api_rescales_keep_max_dimension():
+    # shortest side > 768 after our resize: the API scales it down itself
+    assert vision_max_dimension(1100, 1100, 2048, "openai-high") == 2048
+
+
+def test_other_targets():
+    assert vision_max_dimension(600, 600, 1024) == 1024
+    assert vision_max_dimension(600, 600, 1024, "openai-low") == 512
@@ -0,0 +1,75 @@
+# tests/test_index_store.py
+import faiss
+import numpy as np
+import pytest
+from filelock import FileLock
+
+import index_store
+from index_store import IndexStore
+
+
+@pytest.fixture
+def vec_path(tmp_path, monkeypatch):
+    path = tmp_path / "vec.faiss"
+    monkeypatch.setattr(index_store, "VEC_PATH", path)
+    monkeypatch.setattr(index_store, "_VEC_LOCK", FileLock(str(path) + ".lock"))
+    return path
+
+
+def _store():
+    # one instance per simulated process; no automatic flushes
+    return IndexStore(flush_every=10**6, flush_interval_s=3600)
+
+
+def _vec(seed):
+    v = np.random.default_rng(seed).random((1, 8), dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+def _add(store, i):
+    store.add(_vec(i), np.array([i], dtype="int64"))
+
+
+def _ids_on_disk(path):
+    index = faiss.read_index(str(path))
+    return set(faiss.vector_to_array(index.id_map).tolist())
+
+
+def test_flushes_keep_vectors_of_other_instances(vec_path):
+    a, b = _store(), _store()
+    _add(a, 1)
+    _add(b, 2)  # b loaded before a saved
+    a.flush()
+    b.flush()
+    assert _ids_on_disk(vec_path) == {1, 2}
+
+
+def test_removes_and_adds_replay_on_top_of_other_saves(vec_path):
+    a, b = _store(), _store()
+    _add(a, 1)
+    _add(a, 2)
+    a.flush()
+
+    a.remove(np.array([2], dtype="int64"))
+    _add(b, 3)
+    a.flush()
+    b.flush()
+    assert _ids_on_disk(vec_path) == {1, 3}
+
+    _add(a, 4)  # nothing unsaved in a: picks up b's save first
+    b.remove(np.array([1], dtype="int64"))
+    a.flush()
+    b.flush()
+    assert _ids_on_disk(vec_path) == {3, 4}
+    assert set(faiss.vector_to_array(_store()._get().id_map).tolist()) == {3, 4}
+
+
+def test_vectors_survive_replay(vec_path):
+    a, b = _store(), _store()
+    _add(a, 1)
+    _add(b, 2)
+    a.flush()
+    b.flush()
+    index = faiss.read_index(str(vec_path))
+    _, ids = index.search(_vec(2), 1)
+    assert ids[0][0] == 2
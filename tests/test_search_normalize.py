@@ -0,0 +1,50 @@
+# tests/test_search_normalize.py
+import pytest
+
+from search_normalize import DE_MAP, REV_MAP, de_variants
+
+
+def _baseline_de_variants(token: str) -> set[str]:
+    """de_variants before the regex/product rewrite (reference output)."""
+    vars = {token}
+    for i, ch in enumerate(token):
+        if ch in DE_MAP:
+            new = set()
+            for v in vars:
+                for rep in DE_MAP[ch]:
+                    new.add(v[:i] + rep + v[i + 1 :])
+            vars |= new
+    for s, reps in REV_MAP.items():
+        if s in token.lower():
+            new = set()
+            for v in list(vars):
+                idx = 0
+                low = v.lower()
+                while True:
+                    j = low.find(s, idx)
+                    if j < 0:
+                        break
+                    for rep in reps:
+                        new.add(v[:j] + rep + v[j + len(s) :])
+                    idx = j + 1
+            vars |= new
+    return vars
+
+
+@pytest.mark.parametrize(
+    "token",
+    ["STRASSE", "Strasse", "Mueller", "Masse", "Fuesse", "Schlosssee", "Aerger"],
+)
+def test_covers_baseline_variants(token):
+    # FTS5 (unicode61) matches case-insensitively: compare case-folded
+    new = {v.lower() for v in de_variants(token)}
+    assert {v.lower() for v in _baseline_de_variants(token)} <= new
+
+
+def test_uppercase_ss_maps_to_sharp_s():
+    assert de_variants("STRASSE") == {"STRASSE", "STRAßE", "STRASE"}
+
+
+def test_umlauts():
+    assert de_variants("Müller") == {"Müller", "Muller", "Mueller"}
+    assert de_variants("Straße") == {"Straße", "Strasse"}
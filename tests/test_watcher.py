@@ -0,0 +1,105 @@
+# tests/test_watcher.py
+import hashlib, os, sqlite3, threading, time
+from collections import OrderedDict
+
+import pytest
+
+import index_store
+import watcher
+from fs_ops import file_hash
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / "docs.sqlite"
+    monkeypatch.setattr(index_store, "DB_PATH", path)
+    monkeypatch.setattr(index_store, "_CON", None)
+    yield path
+    if index_store._CON is not None:
+        index_store._CON.close()
+
+
+def _same_size_rewrite(p, text):
+    """Rewrite p with the same size and the old mtime (ctime still moves)."""
+    st = p.stat()
+    time.sleep(0.01)
+    p.write_text(text)
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns))
+    st2 = p.stat()
+    assert (st2.st_size, st2.st_mtime_ns) == (st.st_size, st.st_mtime_ns)
+    assert st2.st_ctime_ns != st.st_ctime_ns
+    return st2
+
+
+class _Batcher:
+    def flush(self):
+        pass
+
+
+def _handler():
+    # just the state _handle_modified uses: no observer/worker threads
+    h = watcher.Handler.__new__(watcher.Handler)
+    h._lock = threading.Lock()
+    h._hash_cache = OrderedDict()
+    h._batcher = _Batcher()
+    h.indexed = []
+    h._index_new = lambda p, doc_id=None: h.indexed.append(doc_id)
+    return h
+
+
+def _put(st, sha, ctime_ns):
+    index_store.stat_hash_put(
+        st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sha, ctime_ns=ctime_ns
+    )
+
+
+def test_unchanged_stat_reuses_the_hash(db, tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_text("hello one")
+    st = p.stat()
+    _put(st, "x" * 64, st.st_ctime_ns)
+    assert watcher._unchanged_hash(st) == "x" * 64
+
+
+def test_same_size_rewrite_with_old_mtime_is_rehashed(db, tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_text("hello one")
+    old = file_hash(p)
+    st = p.stat()
+    _put(st, old, st.st_ctime_ns)
+    index_store._connect().execute(
+        "INSERT INTO docs(doc_id, doc_id_i, path) VALUES (?,?,?)",
+        (old, index_store.sha256_to_i64(old), str(p)),
+    )
+
+    st2 = _same_size_rewrite(p, "hello two")
+    assert watcher._unchanged_hash(st2) is None
+    h = _handler()
+    h._handle_modified(str(p))
+    new = hashlib.sha256(b"hello two").hexdigest()
+    assert h.indexed == [new]
+    assert index_store.stat_hash_lookup(st2.st_dev, st2.st_ino)[2:] == (
+        st2.st_ctime_ns,
+        new,
+    )
+
+
+def test_rows_from_before_the_ctime_column_are_never_reused(db, tmp_path):
+    con = sqlite3.connect(db)
+    con.execute(
+        "CREATE TABLE stat_hash(dev INTEGER, ino INTEGER, size INTEGER,"
+        " mtime_ns INTEGER, sha TEXT, PRIMARY KEY(dev, ino)) WITHOUT ROWID"
+    )
+    p = tmp_path / "a.txt"
+    p.write_text("hello one")
+    st = p.stat()
+    con.execute(
+        "INSERT INTO stat_hash VALUES (?,?,?,?,?)",
+        (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, "x" * 64),
+    )
+    con.commit()
+    con.close()
+
+    index_store.ensure_schema()  # ALTER TABLE adds ctime_ns (NULL)
+    assert index_store.stat_hash_lookup(st.st_dev, st.st_ino)[2] is None
+    assert watcher._unchanged_hash(st) is None
@@ -1,7 +1,9 @@
 # watcher.py — robust move detection + debounce
 from __future__ import annotations
 from pathlib import Path
-import time, hashlib, argparse, threading
+import heapq, math, os, time, argparse, queue, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
@@ -19,55 +21,188 @@ from watchdog.events import (
 
 from ingest import ingest_file, is_supported_file
 from embedder_local import embed_texts_ollama
-from index_store import upsert_document, delete_document, update_path_only, DB_PATH
+from index_store import (
+    DocumentBatcher,
+    delete_document_at_path,
+    ensure_schema,
+    update_path_only,
+    stat_hash_get,
+    stat_hash_lookup,
+    stat_hash_put,
+    DB_PATH,
+)
 from paths import canon
+from fs_ops import file_hash, HASH_PREFIX  # same content ids as classify (FAST_HASH)
 
 import sqlite3
 
 EMB_MODEL = "bge-m3:567m"
+HASH_BATCH = 2  # files hashed side by side (one thread each)
+HASH_BATCH_WAIT_S = 0.05  # max wait for a partner file before hashing alone
+READY_QUIET_S = 1.0  # a file not written for this long counts as complete
+READY_MAX_INTERVAL_S = 0.8  # cap for the growing stat interval
+EMBED_COALESCE_S = 0.1  # new documents within this window share one embed call
+EVENT_WORKERS = 4  # threads processing (coalesced) filesystem events
+EVENT_COALESCE_S = 0.2  # events for one path within this window run once
+RECENT_SWEEP_S = 1.0  # expired debounce entries are dropped this often
+HASH_CACHE_SIZE = 4096  # in-memory (dev, ino, size, mtime_ns) -> hash entries
+SCRUB_INTERVAL_S = 3600.0  # scrubber wakes up this often ...
+SCRUB_FRACTION_PER_DAY = 0.01  # ... and re-hashes this share of the library per day
 
 
 # --------- Utils ----------
-def file_sha256(p: Path) -> str:
-    h = hashlib.sha256()
-    with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(1_048_576), b""):
-            h.update(chunk)
-    return h.hexdigest()
 
 
-def db_get_doc_id_by_path(path: str) -> str | None:
-    con = sqlite3.connect(str(DB_PATH))
+_conn_tls = threading.local()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """
+    One read connection per thread (opened once, not per event). Writes go
+    through index_store's shared connection.
+    """
+    con = getattr(_conn_tls, "con", None)
+    if con is None:
+        con = sqlite3.connect(
+            str(DB_PATH),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=512,
+        )
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+        _conn_tls.con = con
+    return con
+
+
+def _doc_id_for_path(con: sqlite3.Connection, path: str) -> str | None:
+    # covered by idx_docs_path_covering (no table lookup)
     row = con.execute("SELECT doc_id FROM docs WHERE path=?", (path,)).fetchone()
-    con.close()
     return row[0] if row else None
 
 
 def db_has_doc_id(doc_id: str) -> bool:
-    con = sqlite3.connect(str(DB_PATH))
-    row = con.execute("SELECT 1 FROM docs WHERE doc_id=?", (doc_id,)).fetchone()
-    con.close()
+    row = _get_conn().execute("SELECT 1 FROM docs WHERE doc_id=?", (doc_id,)).fetchone()
     return bool(row)
 
 
 def wait_file_ready(p: Path, timeout=3.0, interval=0.1) -> bool:
     """
-    Wait until file is 'stable': size unchanged between checks.
+    Wait until file is 'stable': size/mtime unchanged between checks, or not
+    written for READY_QUIET_S (then a single stat suffices, e.g. for moves).
+    The check interval doubles up to READY_MAX_INTERVAL_S, so slow copies
+    cost a few stats instead of one every 100 ms.
     Avoid hashing/reading while a move/copy is still in progress.
     """
-    end = time.time() + timeout
-    prev = (-1, -1.0)
-    while time.time() < end:
+    return _stable_stat(p, timeout, interval) is not None
+
+
+def _stable_stat(p: Path, timeout=3.0, interval=0.1) -> os.stat_result | None:
+    """wait_file_ready, returning the last stat (None if the file is gone)."""
+    end = time.monotonic() + timeout
+    prev = None
+    while True:
         try:
-            stat = p.stat()
-            sig = (stat.st_size, stat.st_mtime)
-            if sig == prev:
-                return True
+            st = os.stat(p)
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig == prev or time.time_ns() - st.st_mtime_ns > READY_QUIET_S * 1e9:
+                return st
             prev = sig
         except FileNotFoundError:
-            pass
-        time.sleep(interval)
-    return p.exists()
+            st = None
+        left = end - time.monotonic()
+        if left <= 0:
+            break
+        time.sleep(min(interval, left))
+        interval = min(interval * 2, READY_MAX_INTERVAL_S)
+    return st  # not settled in time: go ahead if it still exists
+
+
+class PendingHashQueue:
+    """
+    Collects paths from event callbacks and hashes them in batches of up to
+    HASH_BATCH on parallel threads (hashlib releases the GIL), so a burst of
+    created files is not hashed strictly one after another on the observer
+    thread. callback(path, hash, key) runs on the queue thread as each hash
+    is done (key: whatever was passed to put): it should only hand the result off (the Handler posts it to the
+    event workers), anything slow there holds up all further hashing.
+    """
+
+    def __init__(
+        self, callback, batch=HASH_BATCH, wait_s=HASH_BATCH_WAIT_S, hash_fn=None
+    ):
+        self._callback = callback
+        # hash_fn(path, stat_result) -> hash; stat_result is the readiness stat
+        self._hash_fn = hash_fn or (lambda p, st: file_hash(p))
+        self._batch = batch
+        self._wait_s = wait_s
+        self._q: "queue.Queue[tuple[Path, str | None]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=batch)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, p: Path, key: str | None = None) -> None:
+        self._q.put((p, key))
+
+    def _collect(self) -> list[tuple[Path, str | None]]:
+        batch = [self._q.get()]
+        deadline = time.monotonic() + self._wait_s
+        while len(batch) < self._batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = {
+                self._pool.submit(_ready_hash, p, self._hash_fn): (p, key)
+                for p, key in batch
+            }
+            for fut in as_completed(futures):
+                p, key = futures[fut]
+                try:
+                    h = fut.result()
+                except Exception as e:
+                    print(f"[warn] hashing failed for {p}: {e}")
+                    continue
+                if h is None:
+                    # Datei evtl. gleich weg/umbenannt; nichts tun
+                    continue
+                try:
+                    self._callback(p, h, key)
+                except Exception as e:
+                    print(f"[warn] {p}: {e}")
+
+
+def _unchanged_hash(st: os.stat_result) -> str | None:
+    """
+    Hash recorded for this inode if size, mtime and ctime still match, i.e.
+    nothing was written since (e.g. atime-only events). Any other change,
+    even a same-size rewrite within the mtime granularity, needs a re-hash:
+    otherwise only the scrubber would notice, possibly days later. Rows
+    from before ctime was recorded (NULL) never match.
+    """
+    prev = stat_hash_lookup(st.st_dev, st.st_ino)
+    if prev is None or prev[:3] != (st.st_size, st.st_mtime_ns, st.st_ctime_ns):
+        return None
+    if (":" in prev[3]) != bool(HASH_PREFIX):
+        return None  # other algorithm (FAST_HASH toggled)
+    return prev[3]
+
+
+def _ready_hash(p: Path, hash_fn) -> str | None:
+    """Content hash once the file is stable, None if it vanished."""
+    st = _stable_stat(p)
+    if st is None:
+        return None
+    return hash_fn(p, st)  # reuses the stat: no extra one before the read
 
 
 # --------- Event handler ----------
@@ -75,30 +210,140 @@ class Handler(FileSystemEventHandler):
     def __init__(self, libroot: Path):
         super().__init__()
         self.libroot = libroot
-        self._recent = {}  # path -> expiry_ts
+        self._recent: dict[str, float] = {}  # path -> expiry (monotonic)
+        self._recent_heap: list[tuple[float, str]] = []  # (expiry, path)
         self._lock = threading.Lock()
+        # (st_dev, st_ino, st_size, st_mtime_ns) -> content hash, LRU
+        self._hash_cache: OrderedDict[tuple[int, int, int, int], str] = OrderedDict()
+        # index writes from all workers: one embed call per burst of files
+        self._batcher = DocumentBatcher(
+            lambda texts: embed_texts_ollama(texts, model=EMB_MODEL),
+            embed_model=EMB_MODEL,
+            max_wait_s=EMBED_COALESCE_S,
+        )
+        # hashing on the hash queue, move check + ingest back on the workers
+        self._hashq = PendingHashQueue(self._post_hashed, hash_fn=self._hash)
+        # observer thread only enqueues (kind, src, dest, ts); one coalescer
+        # thread hands settled events to EVENT_WORKERS workers, sharded by
+        # path so events for one path never run concurrently
+        self._q: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker_qs = [queue.SimpleQueue() for _ in range(EVENT_WORKERS)]
+        for wq in self._worker_qs:
+            threading.Thread(target=self._work, args=(wq,), daemon=True).start()
+        threading.Thread(target=self._coalesce, daemon=True).start()
+        threading.Thread(target=self._scrub, daemon=True).start()
+
+    def flush(self):
+        """Wait until queued index writes are done."""
+        self._batcher.flush()
 
     # --- Debounce helpers ---
     def _mark_recent(self, path: str, ttl=2.0):
+        expiry = time.monotonic() + ttl
         with self._lock:
-            self._recent[path] = time.time() + ttl
+            self._recent[path] = expiry
+            heapq.heappush(self._recent_heap, (expiry, path))
+            if len(self._recent_heap) == 1:
+                self._arm_sweep()
 
     def _is_recent(self, path: str) -> bool:
-        now = time.time()
+        # no lock, no sweep: a single dict read is atomic
+        return self._recent.get(path, 0.0) > time.monotonic()
+
+    def _arm_sweep(self):
+        t = threading.Timer(RECENT_SWEEP_S, self._sweep_recent)
+        t.daemon = True
+        t.start()
+
+    def _sweep_recent(self):
+        """Drop expired entries (oldest first, via the heap); re-arms itself."""
+        now = time.monotonic()
         with self._lock:
-            # cleanup expired
-            for k in list(self._recent.keys()):
-                if self._recent[k] < now:
-                    del self._recent[k]
-            return path in self._recent
+            heap = self._recent_heap
+            while heap and heap[0][0] <= now:
+                expiry, path = heapq.heappop(heap)
+                # re-marked paths keep their newer entry
+                if self._recent.get(path) == expiry:
+                    del self._recent[path]
+            if heap:
+                self._arm_sweep()
+
+    # --- hashing ---
+    def _hash(self, p: Path, st: os.stat_result | None = None) -> str:
+        """
+        file_hash, skipped when the stat signature is unchanged: in-memory LRU
+        first, then the stat_hash table (survives watcher restarts).
+        st: a fresh stat of p if the caller has one (e.g. from _stable_stat).
+        """
+        if st is None:
+            st = os.stat(p)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            h = self._hash_cache.get(key)
+            if h is not None:
+                self._hash_cache.move_to_end(key)
+                return h
+        h = stat_hash_get(*key)
+        # ids of the other algorithm (FAST_HASH toggled) do not count
+        if (
+            h is None
+            or not h.startswith(HASH_PREFIX)
+            or (":" in h) != bool(HASH_PREFIX)
+        ):
+            return self._rehash(p, st)
+        self._cache_put(key, h)
+        return h
+
+    def _rehash(self, p: Path, st: os.stat_result) -> str:
+        """file_hash, always read from disk; refreshes both hash caches."""
+        h = file_hash(p)
+        st2 = p.stat()
+        if (st2.st_size, st2.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+            return h  # changed while hashing: do not cache
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        stat_hash_put(*key, h, ctime_ns=st.st_ctime_ns)
+        self._cache_put(key, h)
+        return h
+
+    def _cache_put(self, key: tuple[int, int, int, int], h: str) -> None:
+        with self._lock:
+            self._hash_cache[key] = h
+            self._hash_cache.move_to_end(key)
+            if len(self._hash_cache) > HASH_CACHE_SIZE:
+                self._hash_cache.popitem(last=False)
+
+    def _scrub(self):
+        """
+        Low-priority background check: every SCRUB_INTERVAL_S a random sample
+        of indexed paths (SCRUB_FRACTION_PER_DAY of the library per day) is
+        queued for a full re-hash. Catches content changes the stat shortcuts
+        let through (e.g. created/moved files rewritten with size and mtime
+        restored by tools).
+        """
+        per_run = SCRUB_FRACTION_PER_DAY * SCRUB_INTERVAL_S / 86400
+        while True:
+            time.sleep(SCRUB_INTERVAL_S)
+            try:
+                con = _get_conn()
+                (n,) = con.execute("SELECT count(*) FROM docs").fetchone()
+                rows = con.execute(
+                    "SELECT path FROM docs ORDER BY random() LIMIT ?",
+                    (math.ceil(n * per_run),),
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"[warn] scrub: {e}")
+                continue
+            for (path,) in rows:
+                self._enqueue("scrub", path)
 
     # --- index helpers ---
-    def _index_new(self, p: Path):
+    def _index_new(self, p: Path, doc_id: str | None = None):
         excerpt, _images, cleanup = ingest_file(p)
         try:
             rep = f"title: {p.name}\ntags: \ncaption: \nexcerpt:\n{excerpt or ''}"  # without path
-            doc_id = file_sha256(p)
-            upsert_document(
+            if doc_id is None:
+                doc_id = self._hash(p)
+            self._batcher.submit(
                 doc_id=doc_id,
                 final_path=str(p),
                 title=p.name,
@@ -106,7 +351,6 @@ class Handler(FileSystemEventHandler):
                 caption="",
                 excerpt=excerpt or "",
                 represent_text=rep,
-                embed_fn=lambda texts: embed_texts_ollama(texts, model=EMB_MODEL),
             )
             print(f"[indexed] {p}")
         finally:
@@ -115,17 +359,19 @@ class Handler(FileSystemEventHandler):
             except Exception:
                 pass
 
-    def _treat_created_as_move_or_new(self, p: Path):
+    def _treat_created_as_move_or_new(self, p: Path, key: str):
         """Bei on_created: erst prüfen, ob es eigentlich ein Move ist."""
-        if not wait_file_ready(p):
-            # Datei evtl. gleich weg/umbenannt; nichts tun
-            return
-        try:
-            h = file_sha256(p)
-        except Exception as e:
-            print(f"[warn] hashing failed for {p}: {e}")
-            return
+        # wait + hash off the observer thread, then _on_created_hashed back on
+        # the worker of key (the event's path), in order with its later events
+        self._hashq.put(p, key)
 
+    def _on_created_hashed(self, p: Path, h: str):
+        # events for p handled while it was hashed may have changed it
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            return  # deleted meanwhile
+        h = self._hash(p, st)  # cache hit unless rewritten since
         if db_has_doc_id(h):
             # bereits bekannt -> Move: nur Pfad updaten
             try:
@@ -138,19 +384,92 @@ class Handler(FileSystemEventHandler):
                 print(f"[warn] update_path_only failed, fallback to index: {e}")
 
         # otherwise: really new file
-        self._index_new(p)
+        self._index_new(p, h)
+
+    # --- Event queue ---
+    def _coalesce(self):
+        """
+        Collect events per path until it has been quiet for EVENT_COALESCE_S,
+        then dispatch one event: the latest, except that created/moved are
+        not downgraded by follow-up modified/created events (editors and
+        copies emit created -> modified bursts).
+        """
+        pending: dict[str, tuple] = {}  # key path -> (kind, src, dest, last_ts)
+        while True:
+            timeout = None
+            if pending:
+                oldest = min(ev[3] for ev in pending.values())
+                timeout = max(0.0, oldest + EVENT_COALESCE_S - time.monotonic())
+            try:
+                kind, src, dest, ts = self._q.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                key = dest or src
+                prev = pending.get(key)
+                if (
+                    prev
+                    and prev[0] in ("created", "moved")
+                    and kind in ("created", "modified")
+                ):
+                    kind, src, dest = prev[:3]
+                elif prev and kind == "scrub":
+                    kind, src, dest = prev[:3]  # real events win over the scrubber
+                pending[key] = (kind, src, dest, ts)
+            now = time.monotonic()
+            for key in [
+                k for k, ev in pending.items() if now - ev[3] >= EVENT_COALESCE_S
+            ]:
+                kind, src, dest, _ = pending.pop(key)
+                self._shard(key).put((kind, src, dest))
+
+    def _shard(self, key: str) -> queue.SimpleQueue:
+        """Worker queue of a path: all work for one path runs on one thread."""
+        return self._worker_qs[hash(key) % len(self._worker_qs)]
+
+    def _work(self, wq: queue.SimpleQueue):
+        while True:
+            kind, src, dest = wq.get()
+            try:
+                getattr(self, f"_handle_{kind}")(src, dest)
+            except Exception as e:
+                print(f"[warn] {kind} {src}: {e}")
+
+    def _post_hashed(self, p: Path, h: str, key: str):
+        # hash queue thread -> event worker of key ("dest" carries the hash)
+        self._shard(key).put(("hashed", str(p), h))
 
-    # --- Event callbacks ---
+    def _enqueue(self, kind: str, src: str, dest: str | None = None):
+        self._q.put((kind, src, dest, time.monotonic()))
+
+    # --- Event callbacks (observer thread: enqueue only) ---
     def on_moved(self, event: DirMovedEvent | FileMovedEvent):
-        if event.is_directory:
-            return
-        src = canon(Path(event.src_path))
-        dst = canon(Path(event.dest_path))
-        if not is_supported_file(dst):
+        if not event.is_directory:
+            self._enqueue("moved", event.src_path, event.dest_path)
+
+    def on_created(self, event: DirCreatedEvent | FileCreatedEvent):
+        if not event.is_directory:
+            self._enqueue("created", event.src_path)
+
+    def on_deleted(self, event: DirDeletedEvent | FileDeletedEvent):
+        if not event.is_directory:
+            self._enqueue("deleted", event.src_path)
+
+    def on_modified(self, event: DirModifiedEvent | FileModifiedEvent):
+        if not event.is_directory:
+            self._enqueue("modified", event.src_path)
+
+    # --- Event handling (worker threads) ---
+    def _handle_moved(self, src_path: str, dest_path: str):
+        # suffix check first: canon() resolves the path (syscalls)
+        if not is_supported_file(Path(dest_path)):
             return
+        self._batcher.flush()  # src may still be waiting to be indexed
+        src = canon(Path(src_path))
+        dst = canon(Path(dest_path))
 
         # primary path: try doc_id via old path
-        old_doc = db_get_doc_id_by_path(str(src))
+        old_doc = _doc_id_for_path(_get_conn(), str(src))
         if old_doc:
             # only update path (move)
             update_path_only(old_doc, str(dst))
@@ -159,14 +478,12 @@ class Handler(FileSystemEventHandler):
             return
 
         # fallback: created-as-move
-        self._treat_created_as_move_or_new(dst)
+        self._treat_created_as_move_or_new(dst, dest_path)
 
-    def on_created(self, event: DirCreatedEvent | FileCreatedEvent):
-        if event.is_directory:
-            return
-        p = canon(Path(event.src_path))
-        if not is_supported_file(p):
+    def _handle_created(self, src_path: str, _dest=None):
+        if not is_supported_file(Path(src_path)):
             return
+        p = canon(Path(src_path))
 
         # ignore if already handled via on_moved
         if self._is_recent(str(p)):
@@ -174,40 +491,45 @@ class Handler(FileSystemEventHandler):
             return
 
         # created can actually be a move from another dir/volume
-        self._treat_created_as_move_or_new(p)
+        self._treat_created_as_move_or_new(p, src_path)
 
-    def on_deleted(self, event: DirDeletedEvent | FileDeletedEvent):
-        if event.is_directory:
-            return
-        # doc_id via DB by old path
-        con = sqlite3.connect(str(DB_PATH))
-        row = con.execute(
-            "SELECT doc_id FROM docs WHERE path=?", (str(canon(Path(event.src_path))),)
-        ).fetchone()
-        con.close()
-        if row:
-            delete_document(row[0])
-            print(f"[delete] {event.src_path}")
+    def _handle_hashed(self, src_path: str, h: str):
+        self._on_created_hashed(Path(src_path), h)
 
-    def on_modified(self, event: DirModifiedEvent | FileModifiedEvent):
-        if event.is_directory:
-            return
-        p = Path(event.src_path)
+    def _handle_deleted(self, src_path: str, _dest=None):
+        self._batcher.flush()  # a just-created row may still be queued
+        # doc_id via DB by old path (lookup + delete in one transaction)
+        if delete_document_at_path(str(canon(Path(src_path)))):
+            print(f"[delete] {src_path}")
+
+    def _handle_modified(self, src_path: str, _dest=None):
+        p = Path(src_path)
         if not is_supported_file(p):
             return
-        if not wait_file_ready(p):
+        st = _stable_stat(p)
+        if st is None:
             return
+        self._batcher.flush()  # a just-created row may still be queued
 
         # content changed? -> re-embed (doc_id = content hash changes)
-        new_id = file_sha256(p)
-        con = sqlite3.connect(str(DB_PATH))
-        row = con.execute("SELECT doc_id FROM docs WHERE path=?", (str(p),)).fetchone()
-        con.close()
-        if row and row[0] != new_id:
-            delete_document(row[0])  # altes raus
-            self._index_new(p)  # neues rein
+        new_id = _unchanged_hash(st) or self._rehash(p, st)
+        # altes raus, if indexed under this path with a different hash
+        if delete_document_at_path(str(p), keep_doc_id=new_id):
+            self._index_new(p, new_id)  # neues rein
             print(f"[modify+reindex] {p}")
 
+    def _handle_scrub(self, src_path: str, _dest=None):
+        """Scrubber sample: full re-hash, bypassing both hash caches."""
+        p = Path(src_path)
+        st = _stable_stat(p)
+        if st is None:
+            return
+        h = self._rehash(p, st)
+        self._batcher.flush()
+        if delete_document_at_path(str(p), keep_doc_id=h):
+            self._index_new(p, h)
+            print(f"[scrub+reindex] {p}")
+
 
 def main():
     ap = argparse.ArgumentParser(
@@ -225,8 +547,10 @@ def main():
     if not libroot.exists() or not libroot.is_dir():
         raise SystemExit(f"LIBROOT not found: {libroot}")
 
+    ensure_schema()  # tables + indexes before the first read connection
     obs = PollingObserver() if args.polling else Observer()
-    obs.schedule(Handler(libroot), str(libroot), recursive=True)
+    handler = Handler(libroot)
+    obs.schedule(handler, str(libroot), recursive=True)
     obs.start()
     print(
         f"[watch] {libroot}  ({'polling' if args.polling else 'native'})  –  Ctrl+C to stop"
@@ -237,6 +561,7 @@ def main():
     finally:
         obs.stop()
         obs.join()
+        handler.flush()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,18 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Annotated, List
-import io, sys, traceback
+import asyncio, collections, functools, io, os, sys, time, traceback
 
-from fastapi import FastAPI, Request, Form
+from fastapi import FastAPI, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 
 # --- Project modules ---
 # Sorting / classification
 from taxonomy import list_leaf_paths, build_schema
-from ingest import is_supported_file, ingest_file
-from classify import classify_item  # calls Tags + Index-Update
+from ingest import SUPPORTED_EXTS, ingest_file
+from classify import classify_item_async, flush_index  # calls Tags + Index-Update
+from fs_ops import file_hashes
 
 # Search (hybrid)
 from hybrid_search import hybrid_search
@@ -29,34 +30,96 @@ MIN_CONFIDENCE = 0.6
 KEEP_ALIVE = "10m"  # only Ollama
 ACTION_DEFAULT = "move"  # "move" | "copy"
 DRY_RUN_DEFAULT = False
+SORT_CONCURRENCY = 8  # files classified at the same time (model calls in flight)
+TAXONOMY_TTL_S = 60.0  # cached leaf paths are re-checked at least this often
+
+# last sort errors (file name, TracebackException: no live frames/buffers);
+# tracebacks formatted on demand
+_ERRORS: collections.deque = collections.deque(maxlen=16)
+# /debug/traces from other hosts only with DOCSORT_DEBUG=1 (loopback always)
+DEBUG_TRACES = os.getenv("DOCSORT_DEBUG", "") not in ("", "0")
+_LOOPBACK = {"127.0.0.1", "::1", "localhost"}
 
 EMB_MODEL = "bge-m3:567m"
 
 
+# The templates only depend on module constants / their context: home is
+# rendered once at import, _partials.html compiled once.
+_HOME_HTML = templates.get_template("index.html").render(
+    # Info for UI (read-only hints)
+    cfg={
+        "MODEL_OLLAMA": MODEL_OLLAMA,
+        "MODEL_OPENAI": MODEL_OPENAI,
+        "MIN_CONFIDENCE": MIN_CONFIDENCE,
+        "KEEP_ALIVE": KEEP_ALIVE,
+        "EMB_MODEL": EMB_MODEL,
+        "ACTION_DEFAULT": ACTION_DEFAULT,
+        "DRY_RUN_DEFAULT": DRY_RUN_DEFAULT,
+        "PROVIDER_DEFAULT": PROVIDER_DEFAULT,
+    }
+)
+_PARTIALS = templates.get_template("_partials.html")
+
+
+def _partial(**context) -> HTMLResponse:
+    return HTMLResponse(_PARTIALS.render(**context))
+
+
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            # Info for UI (read-only hints)
-            "cfg": {
-                "MODEL_OLLAMA": MODEL_OLLAMA,
-                "MODEL_OPENAI": MODEL_OPENAI,
-                "MIN_CONFIDENCE": MIN_CONFIDENCE,
-                "KEEP_ALIVE": KEEP_ALIVE,
-                "EMB_MODEL": EMB_MODEL,
-                "ACTION_DEFAULT": ACTION_DEFAULT,
-                "DRY_RUN_DEFAULT": DRY_RUN_DEFAULT,
-                "PROVIDER_DEFAULT": PROVIDER_DEFAULT,
-            },
-        },
+def home():
+    return HTMLResponse(_HOME_HTML)
+
+
+def _taxonomy_stamp(lib_p: Path) -> int:
+    """Newest mtime of lib_p and its direct subfolders (one shallow scandir)."""
+    stamp = lib_p.stat().st_mtime_ns
+    with os.scandir(lib_p) as it:
+        for e in it:
+            try:
+                if e.is_dir():
+                    stamp = max(stamp, e.stat().st_mtime_ns)
+            except OSError:
+                continue
+    return stamp
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_taxonomy(
+    lib_p: str, libroot_mtime_ns: int, ttl_bucket: int
+) -> tuple[tuple, dict]:
+    # ttl_bucket changes every TAXONOMY_TTL_S: deeper edits land eventually
+    allowed = list_leaf_paths(Path(lib_p))
+    return tuple(allowed), build_schema(allowed)
+
+
+def _taxonomy(lib_p: Path) -> tuple[list[str], dict]:
+    allowed, schema = _cached_taxonomy(
+        str(lib_p.resolve()),
+        _taxonomy_stamp(lib_p),
+        int(time.monotonic() // TAXONOMY_TTL_S),
     )
+    return list(allowed), schema
+
+
+def _inbox_files(inbox_p: Path) -> list[Path]:
+    """
+    Supported files in the inbox, by name. os.scandir: the file type comes
+    from the directory entry (no stat per file, except for symlinks), and
+    Path objects are only built for matches.
+    """
+    with os.scandir(inbox_p) as it:
+        entries = [
+            e
+            for e in it
+            if os.path.splitext(e.name)[1].lower() in SUPPORTED_EXTS and e.is_file()
+        ]
+    entries.sort(key=lambda e: e.name)
+    return [Path(e.path) for e in entries]
 
 
 # --- Sort files ---
 @app.post("/sort/run", response_class=HTMLResponse)
-def sort_run(
+async def sort_run(
     request: Request,
     inbox: Annotated[str, Form(...)],
     libroot: Annotated[str, Form(...)],
@@ -66,29 +129,25 @@ def sort_run(
     lib_p = Path(libroot).expanduser()
 
     if not inbox_p.exists() or not inbox_p.is_dir():
-        return templates.TemplateResponse(
-            "_partials.html",
-            {"request": request, "sort_error": f"INBOX nicht gefunden: {inbox_p}"},
-        )
+        return _partial(sort_error=f"INBOX nicht gefunden: {inbox_p}")
     if not lib_p.exists() or not lib_p.is_dir():
-        return templates.TemplateResponse(
-            "_partials.html",
-            {"request": request, "sort_error": f"LIBROOT nicht gefunden: {lib_p}"},
-        )
+        return _partial(sort_error=f"LIBROOT nicht gefunden: {lib_p}")
 
     # Allowed leaf paths & JSON schema
-    allowed = list_leaf_paths(lib_p)
-    schema = build_schema(allowed)
+    allowed, schema = await asyncio.to_thread(_taxonomy, lib_p)
 
     model = MODEL_OPENAI if provider == "openai" else MODEL_OLLAMA
 
-    processed, logs = 0, []
-    for p in sorted(inbox_p.iterdir()):
-        if not is_supported_file(p):
-            continue
-        try:
-            dst = classify_item(
+    files = _inbox_files(inbox_p)
+    # all content hashes up front, in parallel (None: hashed again in classify)
+    hashes = await asyncio.to_thread(file_hashes, files)
+    sem = asyncio.Semaphore(SORT_CONCURRENCY)
+
+    async def one(p: Path, h: str | None):
+        async with sem:
+            return await classify_item_async(
                 src_path=p,
+                doc_id=h,
                 lib_root=lib_p,
                 allowed_paths=allowed,
                 schema=schema,
@@ -99,16 +158,32 @@ def sort_run(
                 keep_alive=KEEP_ALIVE,  # fixed (Ollama only)
                 dry_run=DRY_RUN_DEFAULT,  # fixed
             )
-            processed += 1
-            logs.append(f"[ok] {p.name} -> {dst}")
-        except Exception as ex:
-            tb = traceback.format_exc(limit=1)
-            logs.append(f"[ERROR] {p.name}: {ex}\n{tb}")
-
-    return templates.TemplateResponse(
-        "_partials.html",
-        {"request": request, "sort_logs": logs, "sort_count": processed},
+
+    results = await asyncio.gather(
+        *(one(p, h) for p, h in zip(files, hashes)), return_exceptions=True
     )
+    processed, logs = 0, []
+    for p, res in zip(files, results):
+        if isinstance(res, BaseException):  # incl. CancelledError
+            _ERRORS.append((p.name, traceback.TracebackException.from_exception(res)))
+            logs.append(f"[ERROR] {p.name}: {type(res).__name__}: {res}")
+            continue
+        processed += 1
+        logs.append(f"[ok] {p.name} -> {res}")
+    # results are searchable right after the run
+    await asyncio.to_thread(flush_index)
+
+    return _partial(sort_logs=logs, sort_count=processed)
+
+
+@app.get("/debug/traces", response_class=PlainTextResponse)
+def debug_traces(request: Request):
+    """Tracebacks of the last sort errors (newest last)."""
+    # tracebacks show local paths and provider responses: not for remote clients
+    host = request.client.host if request.client else ""
+    if not DEBUG_TRACES and host not in _LOOPBACK:
+        raise HTTPException(status_code=404)
+    return "\n".join(f"== {name}\n" + "".join(tbe.format()) for name, tbe in _ERRORS)
 
 
 # --- Search files (hybrid search) ---
@@ -121,12 +196,6 @@ def search_run(
     try:
         results = hybrid_search(q, k=k, emb_model=EMB_MODEL)  # fixed embedding model
     except Exception as ex:
-        return templates.TemplateResponse(
-            "_partials.html",
-            {"request": request, "search_error": f"Suche fehlgeschlagen: {ex}"},
-        )
-
-    return templates.TemplateResponse(
-        "_partials.html",
-        {"request": request, "search_results": results, "q": q, "k": k},
-    )
+        return _partial(search_error=f"Suche fehlgeschlagen: {ex}")
+
+    return _partial(search_results=results, q=q, k=k)